@@ -4,7 +4,7 @@
 import aiosqlite
 import json
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
 from pathlib import Path
 
 from .models import ALL_TABLES
@@ -44,7 +44,12 @@ class Database:
     # === CONVERSATIONS ===
     
     async def add_message(self, user_id: int, role: str, content: str):
-        """Добавляет сообщение в историю"""
+        """
+        Добавляет сообщение в историю
+        
+        Возвращается после commit: строка уже записана. Последней в истории
+        она может и не оказаться - другие записи могут закоммититься позже.
+        """
         async with aiosqlite.connect(self.db_path) as db:
             await db.execute("""
                 INSERT INTO conversations (user_id, role, content)
@@ -52,6 +57,15 @@ class Database:
             """, (user_id, role, content))
             await db.commit()
     
+    async def add_messages(self, user_id: int, messages: List[Tuple[str, str]]):
+        """Добавляет несколько сообщений в историю одной транзакцией"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.executemany("""
+                INSERT INTO conversations (user_id, role, content)
+                VALUES (?, ?, ?)
+            """, [(user_id, role, content) for role, content in messages])
+            await db.commit()
+    
     async def get_recent_messages(self, user_id: int, limit: int = 20) -> List[Dict[str, str]]:
         """Получает последние сообщения пользователя"""
         async with aiosqlite.connect(self.db_path) as db:
@@ -348,45 +362,82 @@ class Database:
         Returns:
             Список контента
         """
+        query, params = self._content_query(user_id, content_id, content_type, category, search, limit)
+        
         async with aiosqlite.connect(self.db_path) as db:
             db.row_factory = aiosqlite.Row
             
-            query = "SELECT * FROM content_library WHERE user_id = ?"
-            params = [user_id]
-            
-            if content_id:
-                query += " AND id = ?"
-                params.append(content_id)
-            
-            if content_type:
-                query += " AND content_type = ?"
-                params.append(content_type)
-            
-            if category:
-                query += " AND category = ?"
-                params.append(category)
-            
-            if search:
-                query += " AND (title LIKE ? OR description LIKE ? OR text_content LIKE ?)"
-                search_pattern = f"%{search}%"
-                params.extend([search_pattern, search_pattern, search_pattern])
-            
-            query += " ORDER BY created_at DESC LIMIT ?"
-            params.append(limit)
-            
             async with db.execute(query, params) as cursor:
                 rows = await cursor.fetchall()
-                result = []
-                for row in rows:
-                    item = dict(row)
-                    # Парсим metadata обратно в dict
-                    if item.get('metadata'):
-                        try:
-                            item['metadata'] = json.loads(item['metadata'])
-                        except:
-                            item['metadata'] = {}
-                    result.append(item)
-                return result
+                return [self._content_row(row) for row in rows]
+    
+    async def iter_content(
+        self,
+        user_id: int,
+        content_type: str = None,
+        category: str = None,
+        search: str = None,
+        limit: int = 50
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Как get_content, но отдаёт строки по мере чтения курсора,
+        не дожидаясь выборки целиком
+        """
+        query, params = self._content_query(user_id, None, content_type, category, search, limit)
+        
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            
+            async with db.execute(query, params) as cursor:
+                async for row in cursor:
+                    yield self._content_row(row)
+    
+    @staticmethod
+    def _content_query(
+        user_id: int,
+        content_id: Optional[int],
+        content_type: Optional[str],
+        category: Optional[str],
+        search: Optional[str],
+        limit: int
+    ) -> Tuple[str, List[Any]]:
+        """Собирает SELECT по библиотеке контента с фильтрами"""
+        query = "SELECT * FROM content_library WHERE user_id = ?"
+        params = [user_id]
+        
+        if content_id:
+            query += " AND id = ?"
+            params.append(content_id)
+        
+        if content_type:
+            query += " AND content_type = ?"
+            params.append(content_type)
+        
+        if category:
+            query += " AND category = ?"
+            params.append(category)
+        
+        if search:
+            query += " AND (title LIKE ? OR description LIKE ? OR text_content LIKE ?)"
+            search_pattern = f"%{search}%"
+            params.extend([search_pattern, search_pattern, search_pattern])
+        
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        
+        return query, params
+    
+    @staticmethod
+    def _content_row(row: aiosqlite.Row) -> Dict[str, Any]:
+        """Строка content_library -> dict с распарсенным metadata"""
+        item = dict(row)
+        # Парсим metadata обратно в dict
+        if item.get('metadata'):
+            try:
+                item['metadata'] = json.loads(item['metadata'])
+            except:
+                item['metadata'] = {}
+        return item
     
     async def update_content(
         self,
@@ -447,6 +498,19 @@ class Database:
                 rows = await cursor.fetchall()
                 return [row[0] for row in rows]
     
+    async def get_category_counts(self, user_id: int) -> Dict[str, int]:
+        """Получает количество элементов в каждой категории пользователя"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("""
+                SELECT category, COUNT(*)
+                FROM content_library
+                WHERE user_id = ? AND category IS NOT NULL
+                GROUP BY category
+                ORDER BY category
+            """, (user_id,)) as cursor:
+                rows = await cursor.fetchall()
+                return {row[0]: row[1] for row in rows}
+    
     async def get_content_stats(self, user_id: int) -> Dict[str, int]:
         """Получает статистику по контенту пользователя"""
         async with aiosqlite.connect(self.db_path) as db:
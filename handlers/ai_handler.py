@@ -4,26 +4,161 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ChatAction
+import asyncio
+import io
 import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pytz
 
 from database import Database
 from services import AIService, MemoryService
 from services.function_tools import AVAILABLE_FUNCTIONS, FunctionExecutor
+from handlers.menu_handler import MenuHandler, MENU_BUTTONS
 import config
 
+logger = logging.getLogger(__name__)
+
+_SCREENSHOTS_DIR = Path("data/screenshots")
+_KIEV_TZ = pytz.timezone('Europe/Kiev')
+
+# Интент "покажи последнее фото"
+_LAST_PHOTO_RE = re.compile(r"(покажи|отправь|скинь).*(последн|свеж|крайн).*фото|(покажи|отправь|скинь).*фото.*(последн|свеж|крайн)|последн.*фото")
+# Инструкция для краткого резюме после get_work_stats.
+# Общий dict только читается: HybridAIService.chat не меняет переданные сообщения
+_STATS_SUMMARY_SYSTEM_MSG = {
+    "role": "system",
+    "content": """ВАЖНО: Пользователь уже получил отчет выше. 
+                        
+Дай ОЧЕНЬ КРАТКОЕ резюме (максимум 2 предложения):
+- Кто лидер и кто отстает
+- Главная проблема (если есть)
+
+НЕ ПЕРЕЧИСЛЯЙ всех! НЕ ДУБЛИРУЙ цифры! Только самое важное.
+Пиши как человек, без "рекомендую", "предлагаю" и т.д."""
+}
+
+# Одинаковое сообщение в течение этого времени (сек) считаем повтором
+_DUPLICATE_WINDOW = 5.0
+_LAST_REPLIES_LIMIT = 1000
+
+# Лимит Telegram на сообщение 4096 символов, оставляем запас
+_TELEGRAM_LIMIT = 4000
+_CODE_FENCE = "```"
+
+
+def _split_for_telegram(text: str, limit: int = _TELEGRAM_LIMIT) -> List[str]:
+    """
+    Делит длинный текст на части не длиннее limit по границам строк.
+    Блок кода, разорванный между частями, закрывается в конце части
+    и открывается заново в следующей, чтобы каждая часть оставалась валидной.
+    """
+    if len(text) <= limit:
+        return [text]
+    
+    # Запас на закрывающий "\n```" и открывающий "```\n"
+    budget = limit - 2 * (len(_CODE_FENCE) + 1)
+    parts = []
+    buffer = io.StringIO()
+    size = 0
+    in_code = False
+    
+    def flush():
+        nonlocal buffer, size
+        chunk = buffer.getvalue()
+        if in_code:
+            chunk += ("" if chunk.endswith("\n") else "\n") + _CODE_FENCE
+        if chunk.strip():
+            parts.append(chunk)
+        buffer = io.StringIO()
+        size = 0
+        if in_code:
+            buffer.write(_CODE_FENCE + "\n")
+    
+    for line in text.splitlines(keepends=True):
+        is_fence = line.lstrip().startswith(_CODE_FENCE)
+        # Строки длиннее лимита режем жёстко
+        while line:
+            piece, line = line[:budget], line[budget:]
+            if size and size + len(piece) > budget:
+                flush()
+            buffer.write(piece)
+            size += len(piece)
+        if is_fence:
+            in_code = not in_code
+    
+    if size:
+        parts.append(buffer.getvalue())
+    return parts
+
+
+# Как часто обновлять сообщение при потоковом ответе (Telegram ограничивает частоту edit)
+_STREAM_EDIT_INTERVAL = 0.8
+_THINK_INTERRUPTED = "\n\n⚠️ Ответ оборвался. Попробуй еще раз."
+
+
+async def _safe_edit(message, text: str) -> bool:
+    """Редактирует сообщение, не прерывая ответ из-за ошибок Telegram. Возвращает успех"""
+    try:
+        await message.edit_text(text)
+        return True
+    except Exception as e:
+        logger.debug("Не удалось обновить сообщение: %s", e)
+        return False
+
+
+async def _edit_or_reply(update: Update, message, text: str):
+    """Заменяет текст сообщения, а если правка не прошла - отправляет текст новым сообщением"""
+    if not await _safe_edit(message, text):
+        await update.message.reply_text(text)
+
+
+def _detect_parse_mode(text: str) -> Optional[str]:
+    """
+    Определяет parse_mode ответа: HTML, Markdown или обычный текст.
+    HTML с незакрытыми или слишком многочисленными тегами отправляем как текст.
+    """
+    if '<b>' in text or '<i>' in text or '<code>' in text:
+        # Проверяем что все теги закрыты
+        open_tags = text.count('<b>') + text.count('<i>') + text.count('<code>')
+        close_tags = text.count('</b>') + text.count('</i>') + text.count('</code>')
+        
+        if open_tags != close_tags:
+            logger.warning("⚠️ Неправильный HTML (открыто: %d, закрыто: %d), отправляю как текст", open_tags, close_tags)
+            return None
+        if open_tags > 10:
+            logger.warning("⚠️ Слишком много HTML тегов, отправляю как текст")
+            return None
+        return 'HTML'
+    
+    if '**' in text or '__' in text or '`' in text:
+        return 'Markdown'
+    
+    return None
+
 
 class AIHandler:
-    def __init__(self, db: Database, ai: AIService, memory: MemoryService, 
+    def __init__(self, db: Database, ai: AIService, memory: MemoryService, menu_handler: MenuHandler,
                  extras_service=None, parser_service=None, agent_service=None, personality_service=None):
         self.db = db
         self.ai = ai
         self.memory = memory
+        self.menu_handler = menu_handler
         self.agent = agent_service  # AI Агент для расширенной проактивности
         self.personality = personality_service  # Живая личность для отслеживания активности
         
         # Сохраняем ссылку на бота для ДТЕК мониторинга
         self.bot_context = None
         
+        # user_id -> (текст сообщения, время, ответ) для отсечения повторов
+        self._last_replies: "OrderedDict[int, Tuple[str, float, str]]" = OrderedDict()
+        
         # Function executor для выполнения функций
         self.function_executor = FunctionExecutor(
             db=db,
@@ -39,6 +174,17 @@ class AIHandler:
         user = update.effective_user
         message_text = update.message.text
         
+        # Кнопки меню обрабатываем сразу, без истории, памяти и индикатора печати
+        if message_text in MENU_BUTTONS:
+            await self.menu_handler.handle_menu_button(update, context)
+            return
+        
+        # Повтор того же текста (двойное нажатие, повторная отправка) - отдаём прошлый ответ без ИИ
+        last = self._last_replies.get(user.id)
+        if last and last[0] == message_text and time.monotonic() - last[1] < _DUPLICATE_WINDOW:
+            await update.message.reply_text(last[2], parse_mode=_detect_parse_mode(last[2]))
+            return
+        
         # Сохраняем context для ДТЕК мониторинга
         self.bot_context = context
         
@@ -46,12 +192,6 @@ class AIHandler:
         if self.personality:
             self.personality.update_user_activity(user.id)
         
-        # Проверяем не является ли это кнопкой меню
-        from handlers.menu_handler import MenuHandler
-        menu_handler = MenuHandler()
-        if await menu_handler.handle_menu_button(update, context):
-            return
-        
         # Показываем индикатор печати
         await update.message.chat.send_action(ChatAction.TYPING)
         
@@ -65,11 +205,7 @@ class AIHandler:
         memory_context = await self.memory.get_context_for_ai(user.id)
         
         # Формируем системный промпт с памятью и текущей датой по Киеву
-        from datetime import datetime, timedelta
-        import pytz
-        
-        kiev_tz = pytz.timezone('Europe/Kiev')
-        current_time = datetime.now(kiev_tz)
+        current_time = datetime.now(_KIEV_TZ)
         current_date = current_time.strftime("%Y-%m-%d")
         current_datetime = current_time.strftime("%Y-%m-%d %H:%M")
         current_day = current_time.day
@@ -107,50 +243,79 @@ class AIHandler:
         if memory_context:
             system_prompt += memory_context
         
-        # Формируем сообщения для API
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Добавляем историю
-        for msg in recent_messages:
-            messages.append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
+        # Формируем сообщения для API: системный промпт + история одним списком
+        # (timestamp из строк БД в API не передаём)
+        messages = [
+            {"role": "system", "content": system_prompt},
+            *({"role": msg["role"], "content": msg["content"]} for msg in recent_messages)
+        ]
         
-        # Добавляем текущее сообщение если его еще нет
-        if not recent_messages or recent_messages[-1]["content"] != message_text:
+        # Добавляем текущее сообщение, если последним в истории оказалось не оно
+        # (например, параллельный /think успел записать свои строки позже)
+        if not recent_messages or recent_messages[-1]["role"] != "user" or recent_messages[-1]["content"] != message_text:
             messages.append({"role": "user", "content": message_text})
         
+        # Ответы ассистента копим и пишем в БД одним батчем уже после отправки.
+        # Запись ждём: иначе она гонится с add_message следующего сообщения
+        history: List[Tuple[str, str]] = []
+        sent_media = False
+        try:
+            sent_media = await self._respond(update, context, user, message_text, messages, history)
+        finally:
+            if history:
+                await self.db.add_messages(user.id, history)
+        
+        # Ответ с фото повтором текста не воспроизвести - такие не запоминаем
+        if history and not sent_media:
+            self._remember_reply(user.id, message_text, history[-1][1])
+    
+    def _remember_reply(self, user_id: int, message_text: str, reply: str):
+        """Запоминает последний ответ пользователю для отсечения повторов (LRU)"""
+        self._last_replies[user_id] = (message_text, time.monotonic(), reply)
+        self._last_replies.move_to_end(user_id)
+        if len(self._last_replies) > _LAST_REPLIES_LIMIT:
+            self._last_replies.popitem(last=False)
+    
+    async def _send_and_persist(self, update: Update, text: str, history: List[Tuple[str, str]]):
+        """Отправляет ответ ассистента с подходящим parse_mode и добавляет его в историю"""
+        await update.message.reply_text(text, parse_mode=_detect_parse_mode(text))
+        history.append(("assistant", text))
+    
+    async def _respond(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user,
+                       message_text: str, messages: List[Dict], history: List[Tuple[str, str]]) -> bool:
+        """
+        Формирует и отправляет ответ на сообщение (быстрые интенты, ИИ, function calling)
+        
+        Returns:
+            True, если в ответе были отправлены фото
+        """
         # === Быстрые интенты без ИИ: показать сохранённые фото ===
-        import re
         text_lower = message_text.lower()
-        print(f"🔍 Проверяю интент: '{message_text}' -> '{text_lower}'")
+        logger.debug("🔍 Проверяю интент: %r", text_lower)
         
-        if re.search(r"(покажи|отправь|скинь).*(последн|свеж|крайн).*фото|(покажи|отправь|скинь).*фото.*(последн|свеж|крайн)|последн.*фото", text_lower):
-            print("✅ Найден интент 'показать последнее фото' - отправляю фото + ИИ контекст")
+        if _LAST_PHOTO_RE.search(text_lower):
+            logger.debug("✅ Найден интент 'показать последнее фото' - отправляю фото + ИИ контекст")
             # Берём последнее сохранённое изображение из библиотеки
             items = await self.db.get_content(user.id, content_type='image', limit=1)
-            print(f"📚 Найдено в БД: {len(items)} изображений")
+            logger.debug("📚 Найдено в БД: %d изображений", len(items))
             
             if items:
                 item = items[0]
-                print(f"📸 Данные фото: file_path={item.get('file_path')}, file_id={item.get('file_id')}")
+                logger.debug("📸 Данные фото: file_path=%s, file_id=%s", item.get('file_path'), item.get('file_id'))
                 title = item.get('title', 'Без названия')
                 category = item.get('category', 'other')
                 description = item.get('description', '')
                 
                 # Отправляем фото
                 try:
-                    from pathlib import Path
                     if item.get('file_path') and Path(item['file_path']).exists():
-                        print(f"📁 Отправляю из файла: {item['file_path']}")
-                        with open(item['file_path'], 'rb') as photo:
-                            await update.message.reply_photo(photo=photo, caption=f"📸 <b>{title}</b>\n🏷 {category.title()}", parse_mode='HTML')
-                            print("✅ Фото отправлено успешно!")
+                        logger.debug("📁 Отправляю из файла: %s", item['file_path'])
+                        await update.message.reply_photo(photo=Path(item['file_path']), caption=f"📸 <b>{title}</b>\n🏷 {category.title()}", parse_mode='HTML')
+                        logger.debug("✅ Фото отправлено успешно!")
                     elif item.get('file_id'):
-                        print(f"📱 Отправляю по file_id: {item['file_id']}")
+                        logger.debug("📱 Отправляю по file_id: %s", item['file_id'])
                         await context.bot.send_photo(chat_id=update.effective_chat.id, photo=item['file_id'], caption=f"📸 <b>{title}</b>\n🏷 {category.title()}", parse_mode='HTML')
-                        print("✅ Фото отправлено по file_id!")
+                        logger.debug("✅ Фото отправлено по file_id!")
                     
                     # Теперь ИИ добавляет контекст к фото
                     ai_context = f"""Пользователь просил показать последнее сохранённое фото. Я отправил фото:
@@ -177,19 +342,19 @@ class AIHandler:
                     
                     if ai_response:
                         await update.message.reply_text(ai_response)
-                        await self.db.add_message(user.id, "assistant", ai_response)
+                        history.append(("assistant", ai_response))
                     
-                    return
+                    return True
                     
                 except Exception as e:
-                    print(f"❌ Ошибка отправки фото: {e}")
+                    logger.error("❌ Ошибка отправки фото: %s", e)
                     pass
                 await update.message.reply_text("⚠️ Не удалось отправить фото. Попробуй ещё раз или сохрани новое.")
                 return
             else:
-                print("❌ Нет сохранённых изображений в БД")
+                logger.debug("❌ Нет сохранённых изображений в БД")
         else:
-            print("❌ Интент 'показать фото' не найден, передаю в ИИ")
+            logger.debug("❌ Интент 'показать фото' не найден, передаю в ИИ")
 
         # === ВЫЗОВ ИИ С FUNCTION CALLING + ЭМОЦИОНАЛЬНЫЙ ИНТЕЛЛЕКТ ===
         response = await self.ai.chat(
@@ -210,6 +375,8 @@ class AIHandler:
         # DeepSeek может вернуть либо текст, либо вызов функции
         # Проверяем есть ли вызов функции в ответе
         
+        sent_media = False
+        
         # Пытаемся обработать как обычный ответ
         try:
             # Новый формат: tool_calls (DeepSeek API v1)
@@ -219,46 +386,45 @@ class AIHandler:
                 arguments = json.loads(tool_call["function"]["arguments"])
                 
                 # Выполняем функцию
-                print(f"🔧 Вызов функции: {function_name} с аргументами: {arguments}")
+                logger.debug("🔧 Вызов функции: %s с аргументами: %s", function_name, arguments)
                 function_result = await self.function_executor.execute_function(
                     function_name=function_name,
                     arguments=arguments,
                     user_id=user.id
                 )
-                print(f"✅ Результат функции: {function_result[:200] if function_result else 'None'}...")
+                logger.debug("✅ Результат функции: %.200s...", function_result)
                 
                 # Проверяем, нужно ли отправить фото
                 if function_result and function_result.startswith("SEND_PHOTOS:"):
-                    print(f"📸 Обнаружен запрос на отправку фото: {function_result}")
+                    logger.debug("📸 Обнаружен запрос на отправку фото: %s", function_result)
                     # Формат: SEND_PHOTOS:worker_name|count
                     parts = function_result.replace("SEND_PHOTOS:", "").split("|")
                     worker_name = parts[0]
                     
-                    from pathlib import Path
-                    screenshots_dir = Path("data/screenshots")
-                    screenshots = list(screenshots_dir.glob(f"*{worker_name}*.png"))
+                    screenshots = list(_SCREENSHOTS_DIR.glob(f"*{worker_name}*.png"))
                     
-                    print(f"📁 Найдено скриншотов: {len(screenshots)} в {screenshots_dir}")
+                    logger.debug("📁 Найдено скриншотов: %d в %s", len(screenshots), _SCREENSHOTS_DIR)
                     
                     if screenshots:
+                        # Передаём Path: PTB сам открывает файл и закрывает его после загрузки
                         await update.message.reply_text(f"📸 Отправляю скриншоты для {worker_name}...")
                         for screenshot_path in screenshots:
-                            print(f"📤 Отправляю: {screenshot_path}")
+                            logger.debug("📤 Отправляю: %s", screenshot_path)
                             try:
-                                with open(screenshot_path, 'rb') as photo:
-                                    await update.message.reply_photo(
-                                        photo=photo,
-                                        caption=f"Скриншот: {screenshot_path.name}"
-                                    )
+                                await update.message.reply_photo(
+                                    photo=screenshot_path,
+                                    caption=f"Скриншот: {screenshot_path.name}"
+                                )
                             except Exception as e:
-                                print(f"❌ Ошибка отправки фото: {e}")
+                                logger.error("❌ Ошибка отправки фото: %s", e)
                         function_result = f"✅ Отправлено скриншотов: {len(screenshots)}"
+                        sent_media = True
                     else:
-                        print(f"⚠️ Скриншоты не найдены в {screenshots_dir}")
+                        logger.warning("⚠️ Скриншоты не найдены в %s", _SCREENSHOTS_DIR)
                 
                 # Обработка сохранённого контента из библиотеки
                 elif function_result and function_result.startswith("SEND_CONTENT:"):
-                    print(f"📚 Обнаружен запрос на отправку контента: {function_result}")
+                    logger.debug("📚 Обнаружен запрос на отправку контента: %s", function_result)
                     # Формат: SEND_CONTENT:id1,id2,id3
                     content_ids = function_result.replace("SEND_CONTENT:", "").split(",")
                     
@@ -282,15 +448,13 @@ class AIHandler:
                             if content_type == "image":
                                 # Приоритет: file_path > file_id
                                 if item.get('file_path'):
-                                    from pathlib import Path
                                     file_path = Path(item['file_path'])
                                     if file_path.exists():
-                                        with open(file_path, 'rb') as photo:
-                                            await update.message.reply_photo(
-                                                photo=photo,
-                                                caption=caption,
-                                                parse_mode='HTML'
-                                            )
+                                        await update.message.reply_photo(
+                                            photo=file_path,
+                                            caption=caption,
+                                            parse_mode='HTML'
+                                        )
                                         sent_count += 1
                                 elif item.get('file_id'):
                                     try:
@@ -305,27 +469,16 @@ class AIHandler:
                                         pass  # file_id истёк
                         
                         except Exception as e:
-                            print(f"❌ Ошибка отправки контента {content_id}: {e}")
+                            logger.error("❌ Ошибка отправки контента %s: %s", content_id, e)
                     
                     if sent_count > 0:
                         function_result = f"✅ Отправлено фото: {sent_count}"
+                        sent_media = True
                     else:
                         function_result = "❌ Не удалось отправить фото"
                 
-                # Показываем результат пользователю (определяем формат)
-                # Проверяем на HTML теги
-                if '<b>' in function_result or '<i>' in function_result or '<code>' in function_result:
-                    parse_mode = 'HTML'
-                # Проверяем на Markdown
-                elif '**' in function_result or '__' in function_result or '`' in function_result:
-                    parse_mode = 'Markdown'
-                else:
-                    parse_mode = None
-                
-                await update.message.reply_text(function_result, parse_mode=parse_mode)
-                
-                # Добавляем в БД как сообщение ассистента
-                await self.db.add_message(user.id, "assistant", function_result)
+                # Показываем результат пользователю и добавляем в историю
+                await self._send_and_persist(update, function_result, history)
                 
                 # ВАЖНО: Сначала добавляем сообщение ассистента с tool_calls
                 messages.append({
@@ -344,17 +497,7 @@ class AIHandler:
                 # Финальный ответ ТОЛЬКО для статистики, НЕ для скриншотов
                 if function_name == 'get_work_stats':
                     # Добавляем инструкцию для AI
-                    messages.append({
-                        "role": "system",
-                        "content": """ВАЖНО: Пользователь уже получил отчет выше. 
-                        
-Дай ОЧЕНЬ КРАТКОЕ резюме (максимум 2 предложения):
-- Кто лидер и кто отстает
-- Главная проблема (если есть)
-
-НЕ ПЕРЕЧИСЛЯЙ всех! НЕ ДУБЛИРУЙ цифры! Только самое важное.
-Пиши как человек, без "рекомендую", "предлагаю" и т.д."""
-                    })
+                    messages.append(_STATS_SUMMARY_SYSTEM_MSG)
                     
                     final_response = await self.ai.chat(
                         messages=messages,
@@ -364,8 +507,7 @@ class AIHandler:
                     )
                     
                     if final_response and isinstance(final_response, str) and len(final_response) > 10:
-                        await update.message.reply_text(final_response)
-                        await self.db.add_message(user.id, "assistant", final_response)
+                        await self._send_and_persist(update, final_response, history)
             
             # Старый формат: function_call (для обратной совместимости)
             elif isinstance(response, dict) and "function_call" in response:
@@ -398,100 +540,55 @@ class AIHandler:
                 )
                 
                 if final_response:
-                    await self.db.add_message(user.id, "assistant", final_response)
                     # Если финальный ответ отличается от результата функции, отправляем его
                     if final_response != function_result and len(final_response) > 10:
-                        # Определяем формат
-                        if '<b>' in final_response or '<i>' in final_response or '<code>' in final_response:
-                            parse_mode = 'HTML'
-                        elif '**' in final_response or '__' in final_response or '`' in final_response:
-                            parse_mode = 'Markdown'
-                        else:
-                            parse_mode = None
-                        await update.message.reply_text(final_response, parse_mode=parse_mode)
+                        await self._send_and_persist(update, final_response, history)
+                    else:
+                        history.append(("assistant", final_response))
                 
             else:
                 # Fallback: если пользователь просил последнее фото, отправляем фото вместо текста
-                import re as _re
                 text_lower = message_text.lower()
-                print(f"🔄 Fallback проверка: '{message_text}' -> '{text_lower}'")
+                logger.debug("🔄 Fallback проверка: %r", text_lower)
                 
-                if _re.search(r"(покажи|отправь|скинь).*(последн|свеж|крайн).*фото|(покажи|отправь|скинь).*фото.*(последн|свеж|крайн)|последн.*фото", text_lower):
-                    print("✅ Fallback: Найден интент 'показать последнее фото'")
+                if _LAST_PHOTO_RE.search(text_lower):
+                    logger.debug("✅ Fallback: Найден интент 'показать последнее фото'")
                     items = await self.db.get_content(user.id, content_type='image', limit=1)
-                    print(f"📚 Fallback: Найдено в БД: {len(items)} изображений")
+                    logger.debug("📚 Fallback: Найдено в БД: %d изображений", len(items))
                     
                     if items:
                         item = items[0]
-                        print(f"📸 Fallback: Данные фото: file_path={item.get('file_path')}, file_id={item.get('file_id')}")
+                        logger.debug("📸 Fallback: Данные фото: file_path=%s, file_id=%s", item.get('file_path'), item.get('file_id'))
                         title = item.get('title', 'Без названия')
                         category = item.get('category', 'other')
                         caption = f"📸 <b>{title}</b>\n🏷 {category.title()}"
                         try:
-                            from pathlib import Path
                             if item.get('file_path') and Path(item['file_path']).exists():
-                                print(f"📁 Fallback: Отправляю из файла: {item['file_path']}")
-                                with open(item['file_path'], 'rb') as photo:
-                                    await update.message.reply_photo(photo=photo, caption=caption, parse_mode='HTML')
-                                    print("✅ Fallback: Фото отправлено успешно!")
-                                    return
+                                logger.debug("📁 Fallback: Отправляю из файла: %s", item['file_path'])
+                                await update.message.reply_photo(photo=Path(item['file_path']), caption=caption, parse_mode='HTML')
+                                logger.debug("✅ Fallback: Фото отправлено успешно!")
+                                return True
                             elif item.get('file_id'):
-                                print(f"📱 Fallback: Отправляю по file_id: {item['file_id']}")
+                                logger.debug("📱 Fallback: Отправляю по file_id: %s", item['file_id'])
                                 await context.bot.send_photo(chat_id=update.effective_chat.id, photo=item['file_id'], caption=caption, parse_mode='HTML')
-                                print("✅ Fallback: Фото отправлено по file_id!")
-                                return
+                                logger.debug("✅ Fallback: Фото отправлено по file_id!")
+                                return True
                         except Exception as e:
-                            print(f"❌ Fallback: Ошибка отправки фото: {e}")
+                            logger.error("❌ Fallback: Ошибка отправки фото: %s", e)
                             pass
                     else:
-                        print("❌ Fallback: Нет сохранённых изображений в БД")
-                else:
-                    print("❌ Fallback: Интент 'показать фото' не найден")
-                
-                # Обычный текстовый ответ - определяем формат
-                if '<b>' in response or '<i>' in response or '<code>' in response:
-                    parse_mode = 'HTML'
-                elif '**' in response or '__' in response or '`' in response:
-                    parse_mode = 'Markdown'
+                        logger.debug("❌ Fallback: Нет сохранённых изображений в БД")
                 else:
-                    parse_mode = None
+                    logger.debug("❌ Fallback: Интент 'показать фото' не найден")
                 
-                # Валидация HTML перед отправкой
-                if parse_mode == 'HTML':
-                    try:
-                        # Проверяем что все теги закрыты
-                        open_tags = response.count('<b>') + response.count('<i>') + response.count('<code>')
-                        close_tags = response.count('</b>') + response.count('</i>') + response.count('</code>')
-                        
-                        if open_tags != close_tags:
-                            print(f"⚠️ Неправильный HTML (открыто: {open_tags}, закрыто: {close_tags}), отправляю как текст")
-                            parse_mode = None
-                        else:
-                            # Дополнительная проверка - убираем HTML если слишком много тегов
-                            if open_tags > 10:
-                                print("⚠️ Слишком много HTML тегов, отправляю как текст")
-                                parse_mode = None
-                    except Exception as e:
-                        print(f"⚠️ Ошибка валидации HTML: {e}, отправляю как текст")
-                        parse_mode = None
-                
-                await self.db.add_message(user.id, "assistant", response)
-                await update.message.reply_text(response, parse_mode=parse_mode)
+                # Обычный текстовый ответ
+                await self._send_and_persist(update, response, history)
                 
         except Exception as e:
-            print(f"❌ Ошибка обработки ответа: {e}")
+            logger.error("❌ Ошибка обработки ответа: %s", e)
             # Fallback - отправляем как есть с определением формата
             if isinstance(response, str):
-                # Определяем формат даже в fallback
-                if '<b>' in response or '<i>' in response or '<code>' in response:
-                    parse_mode = 'HTML'
-                elif '**' in response or '__' in response or '`' in response:
-                    parse_mode = 'Markdown'
-                else:
-                    parse_mode = None
-                
-                await self.db.add_message(user.id, "assistant", response)
-                await update.message.reply_text(response, parse_mode=parse_mode)
+                await self._send_and_persist(update, response, history)
             else:
                 await update.message.reply_text(
                     "😔 Произошла ошибка при обработке ответа."
@@ -524,7 +621,9 @@ class AIHandler:
         #                 await update.message.reply_text(prediction)
         #         
         #     except Exception as e:
-        #         print(f"⚠️ Ошибка расширенной проактивности: {e}")
+        #         logger.warning("⚠️ Ошибка расширенной проактивности: %s", e)
+        
+        return sent_media
     
     async def clear_context_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -588,7 +687,8 @@ class AIHandler:
         
         question = " ".join(context.args)
         
-        await update.message.reply_text("🤔 Думаю... (это может занять ~10-20 секунд)")
+        # Это сообщение потом редактируется по мере генерации ответа
+        placeholder = await update.message.reply_text("🤔 Думаю... (это может занять ~10-20 секунд)")
         await update.message.chat.send_action(ChatAction.TYPING)
         
         # Получаем последние сообщения для контекста
@@ -600,26 +700,53 @@ class AIHandler:
         if memory_context:
             system_prompt = f"Ты помощник, который глубоко анализирует вопросы.{memory_context}"
         
-        # Используем reasoning mode
-        response = await self.ai.reasoning_chat(
-            user_message=question,
-            context_messages=recent_messages,
-            system_prompt=system_prompt
-        )
+        # Используем reasoning mode в потоковом режиме: пользователь видит
+        # рассуждение сразу, а не через 10-20 секунд
+        chunks = []
+        shown = ""
+        last_edit = time.monotonic()
+        interrupted = False
+        try:
+            async for chunk in self.ai.reasoning_chat_stream(
+                user_message=question,
+                context_messages=recent_messages,
+                system_prompt=system_prompt
+            ):
+                chunks.append(chunk)
+                if time.monotonic() - last_edit >= _STREAM_EDIT_INTERVAL:
+                    text = "".join(chunks)[:_TELEGRAM_LIMIT]
+                    if text.strip() and text != shown and await _safe_edit(placeholder, text):
+                        shown = text
+                    last_edit = time.monotonic()
+        except Exception as e:
+            logger.warning("⚠️ Поток /think оборвался: %s", e)
+            interrupted = True
         
-        if response:
-            # Сохраняем в историю
-            await self.db.add_message(user.id, "user", f"[THINK] {question}")
-            await self.db.add_message(user.id, "assistant", response)
-            
+        response = "".join(chunks)
+        
+        if response and interrupted:
+            # Обрезанный ответ показываем с пометкой и в историю не пишем
+            await _edit_or_reply(
+                update, placeholder,
+                response[:_TELEGRAM_LIMIT - len(_THINK_INTERRUPTED)] + _THINK_INTERRUPTED
+            )
+        elif response:
             # Отправляем ответ (может быть длинным)
-            # Разбиваем на части если нужно
-            if len(response) > 4000:
-                parts = [response[i:i+4000] for i in range(0, len(response), 4000)]
-                for part in parts:
+            # Разбиваем на части если нужно: первая заменяет заглушку, остальные - новыми сообщениями
+            parts = _split_for_telegram(response)
+            
+            # Запись в БД идёт параллельно с отправкой, а части уходят строго
+            # по очереди - Telegram показывает сообщения в порядке получения
+            save = asyncio.ensure_future(
+                self.db.add_messages(user.id, [("user", f"[THINK] {question}"), ("assistant", response)])
+            )
+            try:
+                if parts[0] != shown:
+                    await _edit_or_reply(update, placeholder, parts[0])
+                for part in parts[1:]:
                     await update.message.reply_text(part)
-            else:
-                await update.message.reply_text(response)
+            finally:
+                await save
         else:
             await update.message.reply_text(
                 "😔 Не удалось получить ответ. Попробуй еще раз."
@@ -5,19 +5,59 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from telegram.constants import ChatAction
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple, Union
 from pathlib import Path
+import asyncio
+import hashlib
+import html
+import logging
 import re
 import time
 
+from cachetools import LRUCache, TTLCache
+
 from database import Database
 from services.content_library_service import ContentLibraryService
 import config
 
+logger = logging.getLogger(__name__)
 
 # Состояния диалога
 WAITING_FOR_TITLE = 1
 
+# URL в тексте сообщения (проверяется для каждого входящего текста)
+_URL_RE = re.compile(r'https?://\S+')
+
+# Префиксы callback_data кнопок библиотеки
+_ACCEPT_PREFIX = "content_accept_"
+_CATEGORY_PREFIX = "content_cat_"
+
+# Версия ключа кэша анализа: увеличить при смене модели или промптов анализа
+_ANALYSIS_CACHE_VERSION = 1
+
+# Сколько результатов /find показываем (и запрашиваем из БД)
+_FIND_LIMIT = 10
+
+# Статичные тексты помощи
+_SAVE_HELP_HTML = (
+    "💾 <b>Режим сохранения активирован!</b>\n\n"
+    "Отправь мне:\n"
+    "• 🖼️ Изображение (карта, скриншот, фото)\n"
+    "• 📝 Текст или код\n"
+    "• 🔗 Ссылку (YouTube, статья, и т.д.)\n"
+    "• 📄 Документ\n"
+    "• 🎵 Аудио\n"
+    "• 🎬 Видео\n\n"
+    "Я автоматически определю что это и предложу категорию!"
+)
+_FIND_HELP_SUFFIX = (
+    "\n\n"
+    "🔍 <b>Поиск:</b>\n"
+    "<code>/find карта метро</code>\n"
+    "<code>/find смешные видео</code>\n"
+    "<code>/find код по API</code>"
+)
+
 
 class ContentHandler:
     """
@@ -27,13 +67,38 @@ class ContentHandler:
     def __init__(self, db: Database, content_service: ContentLibraryService):
         self.db = db
         self.content = content_service
+        self._cat_emoji = content_service.CATEGORY_EMOJI
+        
+        # Список категорий статичен - клавиатуру выбора собираем один раз
+        self._category_keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton(cat_name, callback_data=f"{_CATEGORY_PREFIX}{cat_key}")]
+            for cat_key, cat_name in content_service.CATEGORIES.items()
+        ])
+        
+        # Неизменные ряды клавиатуры запроса названия (кнопка "Принять" зависит от ID)
+        edit_row = [InlineKeyboardButton("✏️ Изменить название", callback_data="content_edit_title")]
+        cancel_row = [InlineKeyboardButton("❌ Отменить", callback_data="content_cancel")]
+        self._title_rows_full = (
+            edit_row,
+            [InlineKeyboardButton("🔄 Другая категория", callback_data="content_change_category")],
+            cancel_row
+        )
+        self._title_rows_short = (edit_row, cancel_row)
         
         # Папка для хранения изображений
         self.images_dir = config.DATA_DIR / "images"
         self.images_dir.mkdir(exist_ok=True)
         
+        # Статистика библиотеки по user_id, сбрасывается при изменении контента
+        self._stats_cache = TTLCache(maxsize=5000, ttl=60)
+        
+        # AI анализ по хэшу содержимого: повторная отправка того же фото/текста
+        # сохраняется без нового запроса к AI
+        self._analysis_cache = LRUCache(maxsize=2048)
+        
         # Временное хранилище для ожидания названия
-        self.pending_content = {}  # {user_id: {content_data, analysis}}
+        # Незавершённые сохранения забываются через 30 минут, чтобы словарь не рос бесконечно
+        self.pending_content = TTLCache(maxsize=10000, ttl=1800)  # {user_id: {content_data, analysis}}
     
     async def handle_save_request(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -41,18 +106,7 @@ class ContentHandler:
         """
         user = update.effective_user
         
-        await update.message.reply_text(
-            "💾 <b>Режим сохранения активирован!</b>\n\n"
-            "Отправь мне:\n"
-            "• 🖼️ Изображение (карта, скриншот, фото)\n"
-            "• 📝 Текст или код\n"
-            "• 🔗 Ссылку (YouTube, статья, и т.д.)\n"
-            "• 📄 Документ\n"
-            "• 🎵 Аудио\n"
-            "• 🎬 Видео\n\n"
-            "Я автоматически определю что это и предложу категорию!",
-            parse_mode='HTML'
-        )
+        await update.message.reply_text(_SAVE_HELP_HTML, parse_mode='HTML')
         
         # Устанавливаем флаг ожидания контента
         context.user_data['waiting_for_content'] = True
@@ -64,7 +118,7 @@ class ContentHandler:
         Returns:
             True если изображение сохранено, False если нужна дальнейшая обработка
         """
-        user = update.effective_user
+        uid = update.effective_user.id
         
         # Проверяем режим сохранения или автосохранение
         if not context.user_data.get('waiting_for_content'):
@@ -73,36 +127,38 @@ class ContentHandler:
         # Убираем флаг ожидания
         context.user_data.pop('waiting_for_content', None)
         
-        await update.message.chat.send_action(ChatAction.TYPING)
-        await update.message.reply_text("🔍 Анализирую изображение...")
-        
-        # Получаем изображение
-        photo = update.message.photo[-1]
-        file = await context.bot.get_file(photo.file_id)
-        image_bytes = await file.download_as_bytearray()
-        
-        # Сохраняем изображение на диск
-        file_name = f"{user.id}_{int(time.time())}.jpg"
-        file_path = self.images_dir / file_name
-        file_path.write_bytes(image_bytes)
-        
-        # Анализируем и получаем предложение от AI
-        content_id, analysis = await self.content.analyze_and_save(
-            user_id=user.id,
-            content_type="image",
-            file_id=photo.file_id,
-            file_path=str(file_path),
-            image_bytes=bytes(image_bytes)
-        )
+        # Подтверждение уходит в Telegram параллельно со скачиванием и анализом
+        ack_task = asyncio.create_task(self._ack(update, "🔍 Анализирую изображение..."))
+        
+        # Подтверждение дожидаемся и при ошибке, чтобы задача не осталась брошенной
+        try:
+            # Получаем изображение
+            photo = update.message.photo[-1]
+            file = await context.bot.get_file(photo.file_id)
+            image_bytes = await file.download_as_bytearray()
+            
+            # Сохраняем изображение на диск
+            file_name = f"{uid}_{int(time.time())}.jpg"
+            file_path = self.images_dir / file_name
+            file_path.write_bytes(image_bytes)
+            
+            # Анализируем и получаем предложение от AI
+            content_id, analysis = await self._analyze_and_save_cached(
+                self._content_key("image", image_bytes),
+                user_id=uid,
+                content_type="image",
+                file_id=photo.file_id,
+                file_path=str(file_path),
+                image_bytes=image_bytes  # bytearray без копии: base64 принимает его напрямую
+            )
+        finally:
+            await ack_task
         
         # Сохраняем в pending для запроса названия
-        self.pending_content[user.id] = {
-            'content_id': content_id,
-            'analysis': analysis
-        }
+        self._set_pending(uid, content_id, analysis)
         
         # Спрашиваем название
-        await self._ask_for_title(update, analysis)
+        await self._ask_for_title(update, content_id, analysis)
         
         return True  # Обработано
     
@@ -113,49 +169,41 @@ class ContentHandler:
         Returns:
             True если текст сохранен, False если нужна дальнейшая обработка
         """
-        user = update.effective_user
+        uid = update.effective_user.id
         text = update.message.text
         
-        # Проверяем режим сохранения
-        if not context.user_data.get('waiting_for_content'):
-            # Автоопределение: длинный текст или код
-            if len(text) < 100:
-                return False  # Короткий текст - обычное сообщение
+        # Короткий текст вне режима сохранения - обычное сообщение
+        # (длинный текст или код сохраняем и без флага)
+        if len(text) < 100 and not context.user_data.get('waiting_for_content'):
+            return False
         
         # Убираем флаг
         context.user_data.pop('waiting_for_content', None)
         
-        await update.message.chat.send_action(ChatAction.TYPING)
-        await update.message.reply_text("🔍 Анализирую текст...")
-        
-        # Определяем это текст или код
-        content_type = "text"  # AI сам определит в analyze_and_save
-        
-        # Анализируем и сохраняем
-        content_id, analysis = await self.content.analyze_and_save(
-            user_id=user.id,
-            content_type=content_type,
-            text_content=text
-        )
+        ack_task = asyncio.create_task(self._ack(update, "🔍 Анализирую текст..."))
         
-        # Обновляем тип если AI определил что это код
-        if analysis.get('content_type') == 'code':
-            await self.db.update_content(content_id, user.id, metadata={'content_type': 'code'})
+        try:
+            # Анализируем и сохраняем (текст или код - AI определит сам)
+            content_id, analysis = await self._analyze_and_save_cached(
+                self._content_key("text", text.encode()),
+                user_id=uid,
+                content_type="text",
+                text_content=text
+            )
+        finally:
+            await ack_task
         
         # Сохраняем в pending
-        self.pending_content[user.id] = {
-            'content_id': content_id,
-            'analysis': analysis
-        }
+        self._set_pending(uid, content_id, analysis)
         
         # Спрашиваем название
-        await self._ask_for_title(update, analysis)
+        await self._ask_for_title(update, content_id, analysis)
         
         return True
     
     async def handle_document_for_library(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
         """Обрабатывает документ для библиотеки"""
-        user = update.effective_user
+        uid = update.effective_user.id
         
         if not context.user_data.get('waiting_for_content'):
             return False
@@ -165,25 +213,25 @@ class ContentHandler:
         document = update.message.document
         file_name = document.file_name
         
-        await update.message.reply_text("📄 Сохраняю документ...")
+        ack_task = asyncio.create_task(update.message.reply_text("📄 Сохраняю документ..."))
         
-        # Сохраняем
-        content_id, analysis = await self.content.analyze_and_save(
-            user_id=user.id,
-            content_type="document",
-            file_id=document.file_id,
-            file_name=file_name,
-            metadata={'mime_type': document.mime_type, 'file_size': document.file_size}
-        )
+        try:
+            # Сохраняем
+            content_id, analysis = await self.content.analyze_and_save(
+                user_id=uid,
+                content_type="document",
+                file_id=document.file_id,
+                file_name=file_name,
+                metadata={'mime_type': document.mime_type, 'file_size': document.file_size}
+            )
+        finally:
+            await ack_task
         
         analysis['suggested_title'] = file_name or "Документ"
         
-        self.pending_content[user.id] = {
-            'content_id': content_id,
-            'analysis': analysis
-        }
+        self._set_pending(uid, content_id, analysis)
         
-        await self._ask_for_title(update, analysis)
+        await self._ask_for_title(update, content_id, analysis)
         
         return True
     
@@ -194,7 +242,7 @@ class ContentHandler:
         Args:
             url: Извлеченный URL из сообщения
         """
-        user = update.effective_user
+        uid = update.effective_user.id
         
         if not context.user_data.get('waiting_for_content'):
             # Автосохранение ссылок можно включить позже
@@ -202,52 +250,117 @@ class ContentHandler:
         
         context.user_data.pop('waiting_for_content', None)
         
-        await update.message.reply_text("🔗 Анализирую ссылку...")
+        ack_task = asyncio.create_task(update.message.reply_text("🔗 Анализирую ссылку..."))
         
-        # Анализируем и сохраняем
-        content_id, analysis = await self.content.analyze_and_save(
-            user_id=user.id,
-            content_type="link",
-            url=url
-        )
+        try:
+            # Анализируем и сохраняем
+            content_id, analysis = await self.content.analyze_and_save(
+                user_id=uid,
+                content_type="link",
+                url=url
+            )
+        finally:
+            await ack_task
         
-        self.pending_content[user.id] = {
-            'content_id': content_id,
-            'analysis': analysis
-        }
+        self._set_pending(uid, content_id, analysis)
         
-        await self._ask_for_title(update, analysis)
+        await self._ask_for_title(update, content_id, analysis)
         
         return True
     
-    async def _ask_for_title(self, update: Update, analysis: Dict):
+    async def _ack(self, update: Update, text: str):
+        """Показывает "печатает..." и отправляет подтверждение получения"""
+        await asyncio.gather(
+            update.message.chat.send_action(ChatAction.TYPING),
+            update.message.reply_text(text)
+        )
+    
+    @staticmethod
+    def _content_key(kind: str, data: Union[bytes, bytearray]) -> Tuple[int, str, bytes]:
+        """Ключ кэша анализа: версия + тип + blake2b содержимого"""
+        return _ANALYSIS_CACHE_VERSION, kind, hashlib.blake2b(data, digest_size=16).digest()
+    
+    async def _analyze_and_save_cached(self, key: Tuple[int, str, bytes], **kwargs) -> Tuple[int, Dict]:
+        """analyze_and_save с кэшем AI анализа по содержимому"""
+        cached = self._analysis_cache.get(key)
+        if cached is not None:
+            # Копия: pending-анализ меняется при выборе категории
+            analysis = dict(cached)
+            content_id = await self.content.save_with_analysis(analysis=analysis, **kwargs)
+            return content_id, analysis
+        
+        content_id, analysis = await self.content.analyze_and_save(**kwargs)
+        if self._is_cacheable(analysis):
+            self._analysis_cache[key] = dict(analysis)
+        return content_id, analysis
+    
+    @staticmethod
+    def _is_cacheable(analysis: Dict) -> bool:
         """
-        Спрашивает название для контента с предложением от AI
+        Запасной результат при сбое AI ("Без названия") и текст ошибки Gemini (с ❌)
+        не кэшируем - иначе разовый сбой закрепится за этим содержимым
+        """
+        if analysis.get('suggested_title') == "Без названия":
+            return False
+        return not str(analysis.get('description') or "").startswith("❌")
+    
+    def _set_pending(self, user_id: int, content_id: int, analysis: Dict):
+        """Запоминает сохранённый контент до подтверждения названия"""
+        self.pending_content[user_id] = {
+            'content_id': content_id,
+            'analysis': analysis
+        }
+        # Новая запись уже в БД - статистика устарела
+        self._stats_cache.pop(user_id, None)
+    
+    async def _get_library_stats(self, user_id: int) -> str:
+        """Статистика библиотеки с кэшем на 60 секунд"""
+        stats = self._stats_cache.get(user_id)
+        if stats is None:
+            stats = await self.content.get_library_stats(user_id)
+            self._stats_cache[user_id] = stats
+        return stats
+    
+    def _build_title_prompt(self, analysis: Dict, content_id: int, *, include_category_button: bool = True) -> Tuple[str, InlineKeyboardMarkup]:
+        """
+        Собирает текст и клавиатуру запроса названия
+        
+        Args:
+            include_category_button: True - первый показ после анализа (с описанием
+                и кнопкой смены категории), False - после смены категории
         """
         suggested_title = analysis.get('suggested_title', 'Без названия')
         category = analysis.get('category', 'other')
-        description = analysis.get('description', '')
         
         # Эмодзи категории
-        category_emoji = self.content.CATEGORIES.get(category, "📂").split()[0]
+        category_emoji = self._cat_emoji.get(category, "📂")
         
-        # Создаем кнопки
-        keyboard = [
-            [InlineKeyboardButton("✅ Принять предложение", callback_data=f"content_accept_{suggested_title}")],
-            [InlineKeyboardButton("✏️ Изменить название", callback_data="content_edit_title")],
-            [InlineKeyboardButton("🔄 Другая категория", callback_data="content_change_category")],
-            [InlineKeyboardButton("❌ Отменить", callback_data="content_cancel")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        if include_category_button:
+            message = (
+                f"✨ <b>Контент проанализирован!</b>\n\n"
+                f"📝 <b>Описание:</b> {analysis.get('description', '')}\n"
+            )
+            rows = self._title_rows_full
+        else:
+            message = "✨ <b>Категория обновлена!</b>\n\n"
+            rows = self._title_rows_short
         
-        message = (
-            f"✨ <b>Контент проанализирован!</b>\n\n"
-            f"📝 <b>Описание:</b> {description}\n"
+        message += (
             f"{category_emoji} <b>Категория:</b> {category.title()}\n"
             f"💡 <b>Предложенное название:</b>\n<code>{suggested_title}</code>\n\n"
             f"Как сохраняем?"
         )
         
+        # Динамическая только кнопка "Принять" - в ней ID контента
+        accept = [InlineKeyboardButton("✅ Принять предложение", callback_data=f"{_ACCEPT_PREFIX}{content_id}")]
+        return message, InlineKeyboardMarkup([accept, *rows])
+    
+    async def _ask_for_title(self, update: Update, content_id: int, analysis: Dict):
+        """
+        Спрашивает название для контента с предложением от AI
+        """
+        message, reply_markup = self._build_title_prompt(analysis, content_id)
+        
         await update.message.reply_text(
             message,
             reply_markup=reply_markup,
@@ -262,18 +375,24 @@ class ContentHandler:
         
         await query.answer()
         
-        if data.startswith("content_accept_"):
-            # Принимаем предложенное название
-            title = data.replace("content_accept_", "")
+        if data.startswith(_ACCEPT_PREFIX):
+            # Принимаем предложенное название (в callback_data только ID:
+            # Telegram ограничивает её 64 байтами, длинное название обрезалось бы)
+            pending_id = data.removeprefix(_ACCEPT_PREFIX)
             
-            if user.id in self.pending_content:
-                content_id = self.pending_content[user.id]['content_id']
+            entry = self.pending_content.get(user.id)
+            if entry is not None and str(entry['content_id']) == pending_id:
+                content_id = entry['content_id']
+                analysis = entry['analysis']
+                title = analysis.get('suggested_title', 'Без названия')
+                category = analysis.get('category', 'other')
                 
-                # Обновляем запись
+                # Обновляем запись: название и выбранная категория одной записью
                 await self.db.update_content(
                     content_id=content_id,
                     user_id=user.id,
-                    title=title
+                    title=title,
+                    category=category
                 )
                 
                 await query.edit_message_text(
@@ -286,6 +405,10 @@ class ContentHandler:
                 )
                 
                 self.pending_content.pop(user.id, None)
+                self._stats_cache.pop(user.id, None)
+            else:
+                # Кнопка от старого или истёкшего сохранения
+                await query.edit_message_text("❌ Время истекло, отправь заново.")
         
         elif data == "content_edit_title":
             # Ожидаем ввод нового названия
@@ -300,41 +423,31 @@ class ContentHandler:
         
         elif data == "content_change_category":
             # Показываем список категорий
-            keyboard = []
-            for cat_key, cat_name in self.content.CATEGORIES.items():
-                keyboard.append([InlineKeyboardButton(cat_name, callback_data=f"content_cat_{cat_key}")])
-            
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
             await query.edit_message_text(
                 "🔄 <b>Выбери категорию:</b>",
-                reply_markup=reply_markup,
+                reply_markup=self._category_keyboard,
                 parse_mode='HTML'
             )
         
-        elif data.startswith("content_cat_"):
+        elif data.startswith(_CATEGORY_PREFIX):
             # Выбрана новая категория
-            new_category = data.replace("content_cat_", "")
+            new_category = data.removeprefix(_CATEGORY_PREFIX)
             
-            if user.id in self.pending_content:
-                self.pending_content[user.id]['analysis']['category'] = new_category
-                
-                content_id = self.pending_content[user.id]['content_id']
-                await self.db.update_content(
-                    content_id=content_id,
-                    user_id=user.id,
-                    category=new_category
-                )
+            entry = self.pending_content.get(user.id)
+            if entry is not None:
+                # Пока только в памяти - в БД категория попадёт вместе с названием
+                entry['analysis']['category'] = new_category
                 
                 # Возвращаемся к вопросу о названии
-                await self._ask_for_title_after_category(query, self.pending_content[user.id]['analysis'])
+                await self._ask_for_title_after_category(query, entry['content_id'], entry['analysis'])
         
         elif data == "content_cancel":
             # Отмена сохранения
-            if user.id in self.pending_content:
-                content_id = self.pending_content[user.id]['content_id']
-                await self.db.delete_content(content_id, user.id)
+            entry = self.pending_content.get(user.id)
+            if entry is not None:
+                await self.db.delete_content(entry['content_id'], user.id)
                 self.pending_content.pop(user.id, None)
+                self._stats_cache.pop(user.id, None)
             
             await query.edit_message_text(
                 "❌ Сохранение отменено.",
@@ -352,18 +465,20 @@ class ContentHandler:
         
         custom_title = update.message.text.strip()
         
-        if user.id in self.pending_content:
-            content_id = self.pending_content[user.id]['content_id']
-            category = self.pending_content[user.id]['analysis'].get('category', 'other')
+        entry = self.pending_content.get(user.id)
+        if entry is not None:
+            content_id = entry['content_id']
+            category = entry['analysis'].get('category', 'other')
             
-            # Обновляем запись
+            # Обновляем запись: название и выбранная категория одной записью
             await self.db.update_content(
                 content_id=content_id,
                 user_id=user.id,
-                title=custom_title
+                title=custom_title,
+                category=category
             )
             
-            category_emoji = self.content.CATEGORIES.get(category, "📂").split()[0]
+            category_emoji = self._cat_emoji.get(category, "📂")
             
             await update.message.reply_text(
                 f"✅ <b>Сохранено!</b>\n\n"
@@ -376,28 +491,16 @@ class ContentHandler:
             )
             
             self.pending_content.pop(user.id, None)
+            self._stats_cache.pop(user.id, None)
         
         return True
     
-    async def _ask_for_title_after_category(self, query, analysis: Dict):
+    async def _ask_for_title_after_category(self, query, content_id: int, analysis: Dict):
         """Повторно спрашивает название после смены категории"""
-        suggested_title = analysis.get('suggested_title', 'Без названия')
-        category = analysis.get('category', 'other')
-        
-        category_emoji = self.content.CATEGORIES.get(category, "📂").split()[0]
-        
-        keyboard = [
-            [InlineKeyboardButton("✅ Принять", callback_data=f"content_accept_{suggested_title}")],
-            [InlineKeyboardButton("✏️ Изменить", callback_data="content_edit_title")],
-            [InlineKeyboardButton("❌ Отменить", callback_data="content_cancel")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        message, reply_markup = self._build_title_prompt(analysis, content_id, include_category_button=False)
         
         await query.edit_message_text(
-            f"✨ <b>Категория обновлена!</b>\n\n"
-            f"{category_emoji} <b>Категория:</b> {category.title()}\n"
-            f"💡 <b>Название:</b> <code>{suggested_title}</code>\n\n"
-            f"Как сохраняем?",
+            message,
             reply_markup=reply_markup,
             parse_mode='HTML'
         )
@@ -415,15 +518,8 @@ class ContentHandler:
         
         if not context.args:
             # Показываем статистику библиотеки
-            stats = await self.content.get_library_stats(user.id)
-            await update.message.reply_text(
-                stats + "\n\n"
-                "🔍 <b>Поиск:</b>\n"
-                "<code>/find карта метро</code>\n"
-                "<code>/find смешные видео</code>\n"
-                "<code>/find код по API</code>",
-                parse_mode='HTML'
-            )
+            stats = await self._get_library_stats(user.id)
+            await update.message.reply_text(stats + _FIND_HELP_SUFFIX, parse_mode='HTML')
             return
         
         query = " ".join(context.args)
@@ -431,10 +527,17 @@ class ContentHandler:
         await update.message.reply_text(f"🔍 Ищу: <i>{query}</i>...", parse_mode='HTML')
         await update.message.chat.send_action(ChatAction.TYPING)
         
-        # Умный поиск через AI
-        results = await self.content.smart_search(user.id, query)
-        
-        if not results:
+        # Умный поиск через AI: результаты отправляем по очереди по мере чтения из БД.
+        # Telegram показывает сообщения в порядке получения, а порядок здесь - это ранжирование
+        found = 0
+        async for item in self.content.smart_search(user.id, query, limit=_FIND_LIMIT):
+            found += 1
+            try:
+                await self._send_content_item(update, context, item)
+            except Exception as e:
+                logger.error("❌ Ошибка отправки контента #%s: %s", item.get('id'), e)
+        
+        if not found:
             await update.message.reply_text(
                 f"😔 Ничего не нашла по запросу: <i>{query}</i>\n\n"
                 f"Попробуй:\n"
@@ -445,14 +548,10 @@ class ContentHandler:
             )
             return
         
-        # Отправляем результаты
         await update.message.reply_text(
-            f"✅ Найдено: <b>{len(results)}</b>",
+            f"✅ Показано: <b>{found}</b>",
             parse_mode='HTML'
         )
-        
-        for item in results[:10]:  # Топ 10 результатов
-            await self._send_content_item(update, context, item)
     
     async def _send_content_item(self, update: Update, context: ContextTypes.DEFAULT_TYPE, item: Dict):
         """Отправляет элемент контента пользователю"""
@@ -462,7 +561,7 @@ class ContentHandler:
         description = item.get('description', '')
         category = item.get('category', 'other')
         
-        category_emoji = self.content.CATEGORIES.get(category, "📂").split()[0]
+        category_emoji = self._cat_emoji.get(category, "📂")
         
         caption = (
             f"📝 <b>{title}</b>\n"
@@ -514,16 +613,17 @@ class ContentHandler:
             text = item['text_content']
             await update.message.reply_text(
                 f"{caption}\n\n"
-                f"<code>{text[:1000]}</code>",
+                f"<code>{html.escape(text[:1000])}</code>",
                 parse_mode='HTML'
             )
         
         elif content_type == "code" and item.get('text_content'):
+            # Тот же HTML, что и в остальных ответах: код с "<", "&" не ломает разметку
             code = item['text_content']
             await update.message.reply_text(
                 f"{caption}\n\n"
-                f"```\n{code[:1000]}\n```",
-                parse_mode='Markdown'
+                f"<pre><code>{html.escape(code[:1000])}</code></pre>",
+                parse_mode='HTML'
             )
         
         elif content_type == "link" and item.get('url'):
@@ -546,18 +646,19 @@ class ContentHandler:
     
     async def library_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда /library для просмотра всей библиотеки"""
-        user = update.effective_user
+        uid = update.effective_user.id
         
-        stats = await self.content.get_library_stats(user.id)
+        stats = await self._get_library_stats(uid)
         await update.message.reply_text(stats, parse_mode='HTML')
     
     async def categories_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда /categories для просмотра категорий"""
         user = update.effective_user
         
-        categories = await self.db.get_categories(user.id)
+        # Одним GROUP BY запросом вместо выборки всех элементов каждой категории
+        counts = await self.db.get_category_counts(user.id)
         
-        if not categories:
+        if not counts:
             await update.message.reply_text(
                 "📂 Пока нет категорий.\n\nСохрани что-нибудь командой /save!"
             )
@@ -565,9 +666,8 @@ class ContentHandler:
         
         text = "📂 <b>Твои категории:</b>\n\n"
         
-        for cat in categories:
-            emoji = self.content.CATEGORIES.get(cat, "📂").split()[0]
-            count = len(await self.db.get_content(user.id, category=cat, limit=1000))
+        for cat, count in counts.items():
+            emoji = self._cat_emoji.get(cat, "📂")
             text += f"{emoji} <code>{cat}</code> — {count} элементов\n"
         
         text += "\n🔍 Найти по категории:\n<code>/find полезное</code>"
@@ -576,8 +676,7 @@ class ContentHandler:
     
     def extract_url_from_text(self, text: str) -> Optional[str]:
         """Извлекает URL из текста"""
-        url_pattern = r'https?://[^\s]+'
-        match = re.search(url_pattern, text)
+        match = _URL_RE.search(text)
         return match.group(0) if match else None
     
     async def auto_suggest_save(
@@ -634,7 +733,7 @@ class ContentHandler:
     async def handle_autosave_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обрабатывает кнопки автосохранения"""
         query = update.callback_query
-        user = update.effective_user
+        uid = update.effective_user.id
         
         await query.answer()
         
@@ -646,27 +745,27 @@ class ContentHandler:
                 await query.edit_message_text("❌ Время истекло, отправь заново.")
                 return
             
-            await query.edit_message_text("🔍 Анализирую...")
+            ack_task = asyncio.create_task(query.edit_message_text("🔍 Анализирую..."))
             
-            # Запускаем полный процесс сохранения
-            content_id, analysis = await self.content.analyze_and_save(
-                user_id=user.id,
-                content_type=pending['content_type'],
-                **pending['kwargs']
-            )
+            try:
+                # Запускаем полный процесс сохранения
+                content_id, analysis = await self.content.analyze_and_save(
+                    user_id=uid,
+                    content_type=pending['content_type'],
+                    **pending['kwargs']
+                )
+            finally:
+                await ack_task
             
             # Сохраняем в pending для запроса названия
-            self.pending_content[user.id] = {
-                'content_id': content_id,
-                'analysis': analysis
-            }
+            self._set_pending(uid, content_id, analysis)
             
             # Создаем новое сообщение с запросом названия
             await query.message.reply_text("✨ Контент проанализирован!")
             
             # Используем существующий метод для запроса названия
             # Создаем фейковый update для _ask_for_title
-            await self._ask_for_title_after_autosave(query, analysis)
+            await self._ask_for_title_after_autosave(query, content_id, analysis)
             
             # Очищаем pending
             context.user_data.pop('auto_save_pending', None)
@@ -676,33 +775,12 @@ class ContentHandler:
             await query.edit_message_text("👌 Хорошо, не буду сохранять.")
             context.user_data.pop('auto_save_pending', None)
     
-    async def _ask_for_title_after_autosave(self, query, analysis: Dict):
+    async def _ask_for_title_after_autosave(self, query, content_id: int, analysis: Dict):
         """Спрашивает название после автосохранения"""
-        suggested_title = analysis.get('suggested_title', 'Без названия')
-        category = analysis.get('category', 'other')
-        description = analysis.get('description', '')
-        
-        category_emoji = self.content.CATEGORIES.get(category, "📂").split()[0]
-        
-        keyboard = [
-            [InlineKeyboardButton("✅ Принять предложение", callback_data=f"content_accept_{suggested_title}")],
-            [InlineKeyboardButton("✏️ Изменить название", callback_data="content_edit_title")],
-            [InlineKeyboardButton("🔄 Другая категория", callback_data="content_change_category")],
-            [InlineKeyboardButton("❌ Отменить", callback_data="content_cancel")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        message = (
-            f"✨ <b>Контент проанализирован!</b>\n\n"
-            f"📝 <b>Описание:</b> {description}\n"
-            f"{category_emoji} <b>Категория:</b> {category.title()}\n"
-            f"💡 <b>Предложенное название:</b>\n<code>{suggested_title}</code>\n\n"
-            f"Как сохраняем?"
-        )
+        message, reply_markup = self._build_title_prompt(analysis, content_id)
         
         await query.message.reply_text(
             message,
             reply_markup=reply_markup,
             parse_mode='HTML'
         )
-
@@ -3,12 +3,126 @@
 """
 from telegram import Update
 from telegram.ext import ContextTypes
+from telegram.constants import ChatAction
 from services.dtek_monitor_service import DTEKMonitorService
+from utils import Cooldown
+from functools import wraps
+import asyncio
 import logging
+import math
+
+__all__ = ["DTEKHandler"]
 
 
 logger = logging.getLogger(__name__)
 
+# Минимальный интервал между запросами графика от одного пользователя (секунды)
+_COOLDOWN_SECONDS = 5.0
+
+# Статичные тексты ответов
+_SETUP_HELP = (
+    "🔌 **Настройка ДТЕК Мониторинга**\n\n"
+    "Использование:\n"
+    "`/dtek_setup <город> <улица> <дом> [черга]`\n\n"
+    "Примеры:\n"
+    "`/dtek_setup \"м. Дніпро\" \"вул. Калинова\" 47 1.2`\n"
+    "`/dtek_setup Дніпро Калинова 47`\n\n"
+    "**Черга** (опционально): 1.1, 1.2, 2.1, 2.2 и т.д."
+)
+_SETUP_NEXT_STEPS = (
+    "\n**Что дальше?**\n"
+    "• `/dtek_now` - проверить сейчас\n"
+    "• `/dtek_today` - график на сегодня\n"
+    "• `/dtek_week` - график на неделю\n"
+    "• `/dtek_monitor_start` - включить уведомления"
+)
+_NO_ADDRESS_MSG = "⚠️ Адрес не настроен. Используй `/dtek_setup`"
+# {minutes} - интервал проверки, подставляется из DEFAULT_CHECK_INTERVAL
+_MONITOR_STARTED = """✅ **Мониторинг Запущен!**
+
+🔔 **Я буду уведомлять тебя о:**
+• Изменениях в графике отключений
+• Приближающихся отключениях (за 15-30 минут)
+• Внезапных изменениях
+
+⏰ **Проверка:** каждые {minutes} минут
+
+**Команды:**
+• `/dtek_now` - проверить сейчас
+• `/dtek_monitor_stop` - остановить мониторинг
+• `/dtek_monitor_status` - статус"""
+
+_MONITOR_STOPPED = (
+    "⏸️ **Мониторинг остановлен.**\n\n"
+    "Запустить снова: `/dtek_monitor_start`"
+)
+_ERROR_MSG = "❌ Произошла ошибка"
+
+# Пометка для графика из кэша, когда ДТЕК не ответил
+_STALE_NOTE = "⚠️ _ДТЕК сейчас недоступен, показываю последние сохранённые данные_\n\n"
+
+
+def _normalize_prefix(value: str, prefix: str, variants: tuple) -> str:
+    """Заменяет любой из вариантов префикса (без учёта регистра) на prefix"""
+    if value.lower().startswith(variants):
+        # Все варианты заканчиваются точкой
+        value = value.split(".", 1)[1].lstrip()
+    return prefix + value
+
+
+def _format_day(day: dict) -> str:
+    """Блок одного дня для графика на неделю"""
+    date_text = day.get("date_text", "")
+    
+    if not day.get("has_shutdowns", False):
+        return f"**{date_text}** ✅\n\n"
+    
+    shutdown_times = day.get("shutdown_times", [])
+    
+    # Показываем максимум 3 первых слота
+    lines = [f"**{date_text}**", *(f"⚡ {time_slot}" for time_slot in shutdown_times[:3])]
+    if len(shutdown_times) > 3:
+        lines.append(f"   ...и еще {len(shutdown_times) - 3}")
+    
+    return "\n".join(lines) + "\n\n"
+
+
+def _require_address(handler):
+    """Команда ДТЕК выполняется только если у пользователя настроен адрес"""
+    @wraps(handler)
+    async def wrapper(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not self.dtek.get_user_address(update.effective_user.id):
+            await update.message.reply_text(_NO_ADDRESS_MSG, parse_mode="Markdown")
+            return
+        return await handler(self, update, context)
+    return wrapper
+
+
+def _format_week_response(result: dict) -> str:
+    """Текст графика на неделю по результату get_week_schedule"""
+    schedule = result.get("schedule", [])
+    warnings = result.get("warnings", [])
+    address = result.get("address", {})
+    
+    parts = [
+        _STALE_NOTE if result.get("stale") else "",
+        "📅 **График Отключений на Неделю**\n\n",
+        f"📍 **Адрес:** {address.get('street')}, {address.get('building')}\n"
+    ]
+    
+    if address.get('queue'):
+        parts.append(f"⚡ **Черга:** {address.get('queue')}\n")
+    
+    parts.append("\n")
+    
+    # Предупреждения (максимум 2)
+    parts.extend(f"⚠️ {warning[:100]}...\n\n" for warning in warnings[:2])
+    
+    # График по дням
+    parts.extend(_format_day(day) for day in schedule)
+    
+    return "".join(parts)
+
 
 class DTEKHandler:
     """
@@ -17,6 +131,22 @@ class DTEKHandler:
     
     def __init__(self, dtek_service: DTEKMonitorService):
         self.dtek = dtek_service
+        self._cooldown = Cooldown()
+    
+    async def _throttled(self, update: Update, endpoint: str) -> bool:
+        """
+        Отвечает "подожди" и возвращает True, если график запрашивают слишком часто
+        
+        Ответ из кэша ДТЕК не нагружает - такие запросы не ограничиваем.
+        """
+        user_id = update.effective_user.id
+        if self.dtek.is_cached(user_id, endpoint):
+            return False
+        wait = self._cooldown.hit(user_id, f"dtek_{endpoint}", _COOLDOWN_SECONDS)
+        if wait:
+            await update.message.reply_text(f"⏳ Подожди {math.ceil(wait)} с")
+            return True
+        return False
     
     async def setup_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -27,16 +157,7 @@ class DTEKHandler:
         user = update.effective_user
         
         if len(context.args) < 3:
-            await update.message.reply_text(
-                "🔌 **Настройка ДТЕК Мониторинга**\n\n"
-                "Использование:\n"
-                "`/dtek_setup <город> <улица> <дом> [черга]`\n\n"
-                "Примеры:\n"
-                "`/dtek_setup \"м. Дніпро\" \"вул. Калинова\" 47 1.2`\n"
-                "`/dtek_setup Дніпро Калинова 47`\n\n"
-                "**Черга** (опционально): 1.1, 1.2, 2.1, 2.2 и т.д.",
-                parse_mode="Markdown"
-            )
+            await update.message.reply_text(_SETUP_HELP, parse_mode="Markdown")
             return
         
         # Парсим аргументы
@@ -45,52 +166,40 @@ class DTEKHandler:
         building = context.args[2]
         queue = context.args[3] if len(context.args) > 3 else None
         
-        # Добавляем префиксы если нужно
-        if not city.startswith("м."):
-            city = f"м. {city}"
-        
-        if not street.startswith("вул."):
-            street = f"вул. {street}"
+        # Приводим префиксы к виду ДТЕК ("М.Дніпро", "ул. Калинова" -> "м. Дніпро", "вул. Калинова")
+        city = _normalize_prefix(city, "м. ", ("м.", "m."))
+        street = _normalize_prefix(street, "вул. ", ("вул.", "ул."))
         
         # Сохраняем адрес
         self.dtek.set_user_address(user.id, city, street, building, queue)
         
-        response = f"""✅ **Адрес сохранен!**
-
-📍 **Город:** {city}
-📍 **Улица:** {street}
-📍 **Дом:** {building}
-"""
+        parts = [
+            "✅ **Адрес сохранен!**\n\n",
+            f"📍 **Город:** {city}\n",
+            f"📍 **Улица:** {street}\n",
+            f"📍 **Дом:** {building}\n"
+        ]
         
         if queue:
-            response += f"⚡ **Черга:** {queue}\n"
+            parts.append(f"⚡ **Черга:** {queue}\n")
         
-        response += "\n**Что дальше?**\n"
-        response += "• `/dtek_now` - проверить сейчас\n"
-        response += "• `/dtek_today` - график на сегодня\n"
-        response += "• `/dtek_week` - график на неделю\n"
-        response += "• `/dtek_monitor_start` - включить уведомления"
+        parts.append(_SETUP_NEXT_STEPS)
         
-        await update.message.reply_text(response, parse_mode="Markdown")
+        await update.message.reply_text("".join(parts), parse_mode="Markdown")
     
+    @_require_address
     async def check_now_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         Проверяет текущий статус
         
         Команда: /dtek_now
         """
-        user = update.effective_user
-        
-        # Проверяем настроен ли адрес
-        if not self.dtek.get_user_address(user.id):
-            await update.message.reply_text(
-                "⚠️ Адрес не настроен.\n\n"
-                "Используй `/dtek_setup` для настройки.",
-                parse_mode="Markdown"
-            )
+        if await self._throttled(update, "now"):
             return
         
-        await update.message.reply_text("🔍 Проверяю текущий статус...")
+        user = update.effective_user
+        
+        await update.message.chat.send_action(ChatAction.TYPING)
         
         try:
             result = await self.dtek.get_current_status(user.id)
@@ -106,7 +215,7 @@ class DTEKHandler:
             has_shutdown = result.get("has_shutdown_now", False)
             today_shutdowns = result.get("today_shutdowns", [])
             
-            response = f"""🔌 **Статус Электроэнергии**
+            response = f"""{_STALE_NOTE if result.get("stale") else ""}🔌 **Статус Электроэнергии**
 
 ⏰ **Текущее время:** {current_time}
 
@@ -114,35 +223,30 @@ class DTEKHandler:
 """
             
             if today_shutdowns:
-                response += f"\n📅 **График на сегодня:**\n"
-                for time_slot in today_shutdowns:
-                    icon = "⚡" if has_shutdown else "🕐"
-                    response += f"{icon} {time_slot}\n"
+                icon = "⚡" if has_shutdown else "🕐"
+                response += "\n📅 **График на сегодня:**\n" + "".join(f"{icon} {time_slot}\n" for time_slot in today_shutdowns)
             else:
                 response += "\n✅ **Сегодня отключений не запланировано!**"
             
             await update.message.reply_text(response, parse_mode="Markdown")
         
         except Exception as e:
-            logger.error(f"❌ Error in check_now: {e}")
+            logger.error("❌ Error in check_now: %s", e, exc_info=True)
             await update.message.reply_text("❌ Произошла ошибка при проверке статуса")
     
+    @_require_address
     async def today_schedule_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         Показывает график на сегодня
         
         Команда: /dtek_today
         """
-        user = update.effective_user
-        
-        if not self.dtek.get_user_address(user.id):
-            await update.message.reply_text(
-                "⚠️ Адрес не настроен. Используй `/dtek_setup`",
-                parse_mode="Markdown"
-            )
+        if await self._throttled(update, "today"):
             return
         
-        await update.message.reply_text("📅 Получаю график на сегодня...")
+        user = update.effective_user
+        
+        await update.message.chat.send_action(ChatAction.TYPING)
         
         try:
             result = await self.dtek.get_today_schedule(user.id)
@@ -154,19 +258,19 @@ class DTEKHandler:
             schedule = result.get("schedule")
             warnings = result.get("warnings", [])
             
-            response = "📅 **График Отключений на Сегодня**\n\n"
+            response = _STALE_NOTE if result.get("stale") else ""
+            response += "📅 **График Отключений на Сегодня**\n\n"
             
             # Предупреждения
-            if warnings:
-                for warning in warnings:
-                    response += f"⚠️ {warning}\n\n"
+            response += "".join(f"⚠️ {warning}\n\n" for warning in warnings)
             
             # График
             if schedule and schedule.get("has_shutdowns"):
-                response += f"**Дата:** {schedule.get('date_text', '')}\n\n"
-                response += "⚡ **Отключения:**\n"
-                for time_slot in schedule.get("shutdown_times", []):
-                    response += f"• {time_slot}\n"
+                response += (
+                    f"**Дата:** {schedule.get('date_text', '')}\n\n"
+                    "⚡ **Отключения:**\n"
+                    + "".join(f"• {time_slot}\n" for time_slot in schedule.get("shutdown_times", []))
+                )
             else:
                 response += "✅ **Отключений не запланировано!**\n"
             
@@ -175,25 +279,22 @@ class DTEKHandler:
             await update.message.reply_text(response, parse_mode="Markdown")
         
         except Exception as e:
-            logger.error(f"❌ Error in today_schedule: {e}")
-            await update.message.reply_text("❌ Произошла ошибка")
+            logger.error("❌ Error in today_schedule: %s", e, exc_info=True)
+            await update.message.reply_text(_ERROR_MSG)
     
+    @_require_address
     async def week_schedule_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         Показывает график на неделю
         
         Команда: /dtek_week
         """
-        user = update.effective_user
-        
-        if not self.dtek.get_user_address(user.id):
-            await update.message.reply_text(
-                "⚠️ Адрес не настроен. Используй `/dtek_setup`",
-                parse_mode="Markdown"
-            )
+        if await self._throttled(update, "week"):
             return
         
-        await update.message.reply_text("📅 Получаю график на неделю...")
+        user = update.effective_user
+        
+        await update.message.chat.send_action(ChatAction.TYPING)
         
         try:
             result = await self.dtek.get_week_schedule(user.id)
@@ -202,46 +303,16 @@ class DTEKHandler:
                 await update.message.reply_text(f"❌ Ошибка: {result.get('error')}")
                 return
             
-            schedule = result.get("schedule", [])
-            warnings = result.get("warnings", [])
-            address = result.get("address", {})
-            
-            response = "📅 **График Отключений на Неделю**\n\n"
-            response += f"📍 **Адрес:** {address.get('street')}, {address.get('building')}\n"
-            
-            if address.get('queue'):
-                response += f"⚡ **Черга:** {address.get('queue')}\n"
-            
-            response += "\n"
-            
-            # Предупреждения
-            if warnings:
-                for warning in warnings[:2]:  # Максимум 2 предупреждения
-                    response += f"⚠️ {warning[:100]}...\n\n"
-            
-            # График по дням
-            for day in schedule:
-                date_text = day.get("date_text", "")
-                has_shutdowns = day.get("has_shutdowns", False)
-                shutdown_times = day.get("shutdown_times", [])
-                
-                if has_shutdowns:
-                    response += f"**{date_text}**\n"
-                    # Показываем максимум 3 первых слота
-                    for time_slot in shutdown_times[:3]:
-                        response += f"⚡ {time_slot}\n"
-                    if len(shutdown_times) > 3:
-                        response += f"   ...и еще {len(shutdown_times) - 3}\n"
-                    response += "\n"
-                else:
-                    response += f"**{date_text}** ✅\n\n"
+            # Сборка текста - чистый CPU, уводим с event loop
+            response = await asyncio.to_thread(_format_week_response, result)
             
             await update.message.reply_text(response, parse_mode="Markdown")
         
         except Exception as e:
-            logger.error(f"❌ Error in week_schedule: {e}")
-            await update.message.reply_text("❌ Произошла ошибка")
+            logger.error("❌ Error in week_schedule: %s", e, exc_info=True)
+            await update.message.reply_text(_ERROR_MSG)
     
+    @_require_address
     async def start_monitor_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         Запускает мониторинг
@@ -250,32 +321,15 @@ class DTEKHandler:
         """
         user = update.effective_user
         
-        if not self.dtek.get_user_address(user.id):
-            await update.message.reply_text(
-                "⚠️ Адрес не настроен. Используй `/dtek_setup`",
-                parse_mode="Markdown"
-            )
-            return
-        
-        # Запускаем мониторинг (проверка каждые 30 минут)
+        # Запускаем мониторинг с интервалом по умолчанию
         bot = context.bot
-        await self.dtek.start_monitoring(user.id, bot, check_interval=1800)
+        interval = self.dtek.DEFAULT_CHECK_INTERVAL
+        await self.dtek.start_monitoring(user.id, bot, check_interval=interval)
         
-        response = """✅ **Мониторинг Запущен!**
-
-🔔 **Я буду уведомлять тебя о:**
-• Изменениях в графике отключений
-• Приближающихся отключениях (за 15-30 минут)
-• Внезапных изменениях
-
-⏰ **Проверка:** каждые 30 минут
-
-**Команды:**
-• `/dtek_now` - проверить сейчас
-• `/dtek_monitor_stop` - остановить мониторинг
-• `/dtek_monitor_status` - статус"""
-        
-        await update.message.reply_text(response, parse_mode="Markdown")
+        await update.message.reply_text(
+            _MONITOR_STARTED.format(minutes=interval // 60),
+            parse_mode="Markdown"
+        )
     
     async def stop_monitor_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -287,11 +341,7 @@ class DTEKHandler:
         
         await self.dtek.stop_monitoring(user.id)
         
-        await update.message.reply_text(
-            "⏸️ **Мониторинг остановлен.**\n\n"
-            "Запустить снова: `/dtek_monitor_start`",
-            parse_mode="Markdown"
-        )
+        await update.message.reply_text(_MONITOR_STOPPED, parse_mode="Markdown")
     
     async def monitor_status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -301,37 +351,38 @@ class DTEKHandler:
         """
         user = update.effective_user
         
-        is_monitoring = user.id in self.dtek.monitoring_tasks
-        address = self.dtek.get_user_address(user.id)
+        state = self.dtek.get_user_state(user.id)
+        address = state["address"]
+        is_monitoring = state["is_monitoring"]
         
-        response = "📊 **Статус ДТЕК Мониторинга**\n\n"
+        parts = ["📊 **Статус ДТЕК Мониторинга**\n\n"]
         
         if address:
-            response += f"📍 **Адрес:** {address.get('street')}, {address.get('building')}\n"
+            parts.append(f"📍 **Адрес:** {address.get('street')}, {address.get('building')}\n")
             if address.get('queue'):
-                response += f"⚡ **Черга:** {address.get('queue')}\n"
+                parts.append(f"⚡ **Черга:** {address.get('queue')}\n")
         else:
-            response += "⚠️ **Адрес не настроен**\n"
+            parts.append("⚠️ **Адрес не настроен**\n")
         
-        response += "\n"
+        parts.append("\n")
         
         if is_monitoring:
-            response += "🟢 **Мониторинг:** Активен\n"
-            response += "⏰ **Проверка:** каждые 30 минут\n"
+            parts.append(f"🟢 **Мониторинг:** Активен\n⏰ **Проверка:** каждые {state['interval'] // 60} минут\n")
         else:
-            response += "⚪ **Мониторинг:** Не активен\n"
+            parts.append("⚪ **Мониторинг:** Не активен\n")
         
-        response += "\n**Команды:**\n"
+        parts.append("\n**Команды:**\n")
         if address:
-            response += "• `/dtek_now` - проверить сейчас\n"
-            response += "• `/dtek_today` - график на сегодня\n"
-            
-            if not is_monitoring:
-                response += "• `/dtek_monitor_start` - запустить\n"
-            else:
-                response += "• `/dtek_monitor_stop` - остановить\n"
+            parts.append(
+                "• `/dtek_now` - проверить сейчас\n"
+                "• `/dtek_today` - график на сегодня\n"
+            )
+            parts.append(
+                "• `/dtek_monitor_stop` - остановить\n" if is_monitoring
+                else "• `/dtek_monitor_start` - запустить\n"
+            )
         else:
-            response += "• `/dtek_setup` - настроить адрес\n"
+            parts.append("• `/dtek_setup` - настроить адрес\n")
         
-        await update.message.reply_text(response, parse_mode="Markdown")
+        await update.message.reply_text("".join(parts), parse_mode="Markdown")
 
@@ -1,10 +1,69 @@
 """
 Обработчик эмоционального интеллекта
 """
+import heapq
+from operator import itemgetter
+
 from telegram import Update
 from telegram.ext import ContextTypes
 from services.emotional_intelligence import EmotionalIntelligence
 
+__all__ = ["EmotionHandler"]
+
+
+# Эмодзи для эмоций
+_EMOTION_EMOJIS = {
+    "happy": "😊",
+    "sad": "😔",
+    "anxious": "😰",
+    "angry": "😠",
+    "tired": "😴",
+    "excited": "🤩",
+    "confused": "😕",
+    "neutral": "😐"
+}
+
+# Названия эмоций на русском
+_EMOTION_NAMES = {
+    "happy": "Радость",
+    "sad": "Грусть",
+    "anxious": "Тревога",
+    "angry": "Злость",
+    "tired": "Усталость",
+    "excited": "Восторг",
+    "confused": "Растерянность",
+    "neutral": "Нейтрально"
+}
+
+# Полоски распределения: _BARS[n] - n заполненных делений из 10
+_BARS = tuple("█" * i + "░" * (10 - i) for i in range(11))
+
+# Описание тренда
+_TREND_TEXT = {
+    "improving": "📈 Улучшается",
+    "worsening": "📉 Ухудшается",
+    "stable": "➡️ Стабильно"
+}
+
+# Сколько эмоций показываем в распределении
+_TOP_EMOTIONS = 5
+
+# Строка распределения: "😊 Радость: ███░░░░░░░ 30%"
+_EMOTION_ROW = "{emoji} {name}: {bar} {pct:.0f}%".format
+
+
+def _distribution_lines(distribution: dict) -> list:
+    """Строки с полосками для самых частых эмоций распределения"""
+    return [
+        _EMOTION_ROW(
+            emoji=_EMOTION_EMOJIS.get(emotion, ""),
+            name=_EMOTION_NAMES.get(emotion, emotion),
+            bar=_BARS[int(percentage * 10)],
+            pct=percentage * 100
+        )
+        for emotion, percentage in heapq.nlargest(_TOP_EMOTIONS, distribution.items(), key=itemgetter(1))
+    ]
+
 
 class EmotionHandler:
     """
@@ -22,11 +81,8 @@ class EmotionHandler:
         """
         user = update.effective_user
         
-        # Получаем сводку за 24 часа
-        summary_24h = self.emotional.get_emotion_summary(user.id, hours=24)
-        
-        # Получаем сводку за последние 6 часов
-        summary_6h = self.emotional.get_emotion_summary(user.id, hours=6)
+        # Сводки за 24 часа и за последние 6 часов одним проходом по истории
+        summary_24h, summary_6h = self.emotional.get_emotion_summaries(user.id, 24, 6)
         
         # Формируем ответ
         if summary_24h["count"] == 0:
@@ -36,79 +92,21 @@ class EmotionHandler:
             )
             return
         
-        # Эмодзи для эмоций
-        emotion_emojis = {
-            "happy": "😊",
-            "sad": "😔",
-            "anxious": "😰",
-            "angry": "😠",
-            "tired": "😴",
-            "excited": "🤩",
-            "confused": "😕",
-            "neutral": "😐"
-        }
-        
-        # Названия эмоций на русском
-        emotion_names = {
-            "happy": "Радость",
-            "sad": "Грусть",
-            "anxious": "Тревога",
-            "angry": "Злость",
-            "tired": "Усталость",
-            "excited": "Восторг",
-            "confused": "Растерянность",
-            "neutral": "Нейтрально"
-        }
-        
-        # Описание тренда
-        trend_text = {
-            "improving": "📈 Улучшается",
-            "worsening": "📉 Ухудшается",
-            "stable": "➡️ Стабильно"
-        }
-        
-        # Формируем распределение эмоций за 24 часа
-        emotions_list_24h = []
-        for emotion, percentage in sorted(
-            summary_24h["emotions_distribution"].items(),
-            key=lambda x: x[1],
-            reverse=True
-        ):
-            emoji = emotion_emojis.get(emotion, "")
-            name = emotion_names.get(emotion, emotion)
-            bar_length = int(percentage * 10)
-            bar = "█" * bar_length + "░" * (10 - bar_length)
-            emotions_list_24h.append(
-                f"{emoji} {name}: {bar} {percentage*100:.0f}%"
-            )
-        
-        # Формируем распределение эмоций за 6 часов
-        emotions_list_6h = []
-        if summary_6h["count"] > 0:
-            for emotion, percentage in sorted(
-                summary_6h["emotions_distribution"].items(),
-                key=lambda x: x[1],
-                reverse=True
-            ):
-                emoji = emotion_emojis.get(emotion, "")
-                name = emotion_names.get(emotion, emotion)
-                bar_length = int(percentage * 10)
-                bar = "█" * bar_length + "░" * (10 - bar_length)
-                emotions_list_6h.append(
-                    f"{emoji} {name}: {bar} {percentage*100:.0f}%"
-                )
+        # Распределение эмоций за 24 и 6 часов (топ эмоций по доле)
+        emotions_list_24h = _distribution_lines(summary_24h["emotions_distribution"])
+        emotions_list_6h = _distribution_lines(summary_6h["emotions_distribution"])
         
         # Доминирующая эмоция
         dominant_24h = summary_24h["dominant_emotion"]
-        dominant_emoji_24h = emotion_emojis.get(dominant_24h, "")
-        dominant_name_24h = emotion_names.get(dominant_24h, dominant_24h)
+        dominant_emoji_24h = _EMOTION_EMOJIS.get(dominant_24h, "")
+        dominant_name_24h = _EMOTION_NAMES.get(dominant_24h, dominant_24h)
         
         response = f"""💙 **Эмоциональная Аналитика AIVE**
 
 📅 **За последние 24 часа:**
 Доминирующая эмоция: {dominant_emoji_24h} {dominant_name_24h}
 Средняя интенсивность: {summary_24h['average_intensity']*100:.0f}%
-Тренд: {trend_text.get(summary_24h['trend'], summary_24h['trend'])}
+Тренд: {_TREND_TEXT.get(summary_24h['trend'], summary_24h['trend'])}
 Сообщений проанализировано: {summary_24h['count']}
 
 **Распределение эмоций (24ч):**
@@ -117,8 +115,8 @@ class EmotionHandler:
         
         if summary_6h["count"] > 0:
             dominant_6h = summary_6h["dominant_emotion"]
-            dominant_emoji_6h = emotion_emojis.get(dominant_6h, "")
-            dominant_name_6h = emotion_names.get(dominant_6h, dominant_6h)
+            dominant_emoji_6h = _EMOTION_EMOJIS.get(dominant_6h, "")
+            dominant_name_6h = _EMOTION_NAMES.get(dominant_6h, dominant_6h)
             
             response += f"""
 ⏰ **За последние 6 часов:**
@@ -130,12 +128,12 @@ class EmotionHandler:
 """
         
         # Проверяем нужно ли поддержать
-        support_msg = self.emotional.get_support_message(user.id)
+        support_msg = self.emotional.get_support_message(user.id, summary_6h)
         if support_msg:
             response += f"\n\n{support_msg}"
         
         # Проверяем нужно ли поздравить
-        celebration_msg = self.emotional.get_celebration_message(user.id)
+        celebration_msg = self.emotional.get_celebration_message(user.id, summary_6h)
         if celebration_msg:
             response += f"\n\n{celebration_msg}"
         
@@ -161,33 +159,9 @@ class EmotionHandler:
         # Анализируем эмоцию
         analysis = self.emotional.analyze_emotion(text)
         
-        # Эмодзи для эмоций
-        emotion_emojis = {
-            "happy": "😊",
-            "sad": "😔",
-            "anxious": "😰",
-            "angry": "😠",
-            "tired": "😴",
-            "excited": "🤩",
-            "confused": "😕",
-            "neutral": "😐"
-        }
-        
-        # Названия эмоций
-        emotion_names = {
-            "happy": "Радость",
-            "sad": "Грусть",
-            "anxious": "Тревога",
-            "angry": "Злость",
-            "tired": "Усталость",
-            "excited": "Восторг",
-            "confused": "Растерянность",
-            "neutral": "Нейтрально"
-        }
-        
         emotion = analysis["emotion"]
-        emoji = emotion_emojis.get(emotion, "")
-        name = emotion_names.get(emotion, emotion)
+        emoji = _EMOTION_EMOJIS.get(emotion, "")
+        name = _EMOTION_NAMES.get(emotion, emotion)
         
         response = f"""🎭 **Анализ Эмоции**
 
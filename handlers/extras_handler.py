@@ -1,16 +1,45 @@
 """
 Обработчики дополнительных функций
 """
+import math
+import random
+import re
+
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ChatAction
 
 from services.extras_service import ExtrasService
+from utils import Cooldown
+
+__all__ = ["ExtrasHandler"]
+
+
+# Аргумент /dice: "2d6", "d20", "3d" или просто "3"
+_DICE_RE = re.compile(r"^(\d+)?d(\d+)?$|^(\d+)$")
+
+# Минимальный интервал между запросами к внешним API от одного пользователя (секунды)
+_COOLDOWN_SECONDS = 5.0
 
 
 class ExtrasHandler:
     def __init__(self, extras: ExtrasService):
         self.extras = extras
+        self._cooldown = Cooldown()
+    
+    async def _throttled(self, update: Update, command: str, fetch, *args) -> bool:
+        """
+        Отвечает "подожди" и возвращает True, если команду вызывают слишком часто
+        
+        Ответ fetch(*args) из кэша API не нагружает - такие вызовы не ограничиваем.
+        """
+        if self.extras.is_cached(fetch, *args):
+            return False
+        wait = self._cooldown.hit(update.effective_user.id, command, _COOLDOWN_SECONDS)
+        if wait:
+            await update.message.reply_text(f"⏳ Подожди {math.ceil(wait)} с")
+            return True
+        return False
     
     # === ИНФОРМАЦИЯ ===
     
@@ -20,6 +49,9 @@ class ExtrasHandler:
         """
         city = " ".join(context.args) if context.args else "Moscow"
         
+        if await self._throttled(update, "weather", self.extras.get_weather, city):
+            return
+        
         await update.message.chat.send_action(ChatAction.TYPING)
         
         weather = await self.extras.get_weather(city)
@@ -33,6 +65,9 @@ class ExtrasHandler:
         """
         /rates - показывает курсы валют
         """
+        if await self._throttled(update, "rates", self.extras.get_exchange_rates):
+            return
+        
         await update.message.chat.send_action(ChatAction.TYPING)
         
         rates = await self.extras.get_exchange_rates()
@@ -56,6 +91,9 @@ class ExtrasHandler:
         """
         symbol = context.args[0].upper() if context.args else "BTC"
         
+        if await self._throttled(update, "crypto", self.extras.get_crypto_price, symbol):
+            return
+        
         await update.message.chat.send_action(ChatAction.TYPING)
         
         price = await self.extras.get_crypto_price(symbol)
@@ -134,17 +172,11 @@ class ExtrasHandler:
         sides = 6
         count = 1
         
-        if context.args:
-            try:
-                arg = context.args[0].lower()
-                if 'd' in arg:
-                    parts = arg.split('d')
-                    count = int(parts[0]) if parts[0] else 1
-                    sides = int(parts[1]) if parts[1] else 6
-                else:
-                    count = int(arg)
-            except:
-                pass
+        # Неверный аргумент - просто бросок по умолчанию
+        match = _DICE_RE.match(context.args[0].lower()) if context.args else None
+        if match:
+            count = int(match.group(1) or match.group(3) or 1)
+            sides = int(match.group(2) or 6)
         
         result = self.extras.roll_dice(sides, count)
         
@@ -187,7 +219,8 @@ class ExtrasHandler:
             return
         
         text = " ".join(context.args)
-        choices = [c.strip() for c in text.split("или")]
+        # Пустые варианты ("или или", "или" в конце) отбрасываем
+        choices = [c for c in (c.strip() for c in text.split("или")) if c]
         
         if len(choices) < 2:
             await update.message.reply_text(
@@ -195,7 +228,6 @@ class ExtrasHandler:
             )
             return
         
-        import random
         choice = random.choice(choices)
         
         await update.message.reply_text(
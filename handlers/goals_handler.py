@@ -5,9 +5,29 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from services.goals_service import GoalsService
 from datetime import datetime, timedelta
+from typing import Dict
 import pytz
 
 
+_UKRAINE_TZ = pytz.timezone('Europe/Kiev')
+
+# Прогресс-бары для 0..100%: _PROGRESS_BARS[p] - p // 10 заполненных делений из 10
+_PROGRESS_BARS = tuple("█" * (p // 10) + "░" * (10 - p // 10) for p in range(101))
+
+_STATUS_ICONS = {
+    "active": "🎯",
+    "completed": "✅",
+    "failed": "❌",
+    "paused": "⏸️"
+}
+
+
+def _goal_datetime(goal: Dict, field: str) -> datetime:
+    """Дата из цели: готовый datetime от GoalsService или разбор ISO-строки (старые записи)"""
+    value = goal.get(f"_{field}_dt")
+    return value if value is not None else datetime.fromisoformat(goal[field])
+
+
 class GoalsHandler:
     """
     Обработчик команд целей и трекинга
@@ -77,7 +97,7 @@ class GoalsHandler:
             goals = await self.goals.get_active_goals(user.id)
             title = "🎯 **Активные Цели**"
         elif filter_type == "completed":
-            goals = [g for g in self.goals.goals_storage.get(user.id, []) if g["status"] == "completed"]
+            goals = await self.goals.get_goals_by_status(user.id, "completed")
             title = "✅ **Выполненные Цели**"
         else:  # all
             goals = self.goals.goals_storage.get(user.id, [])
@@ -95,7 +115,7 @@ class GoalsHandler:
         # Получаем статистику
         stats = await self.goals.get_statistics(user.id)
         
-        response = f"""{title}
+        parts = [f"""{title}
 
 **Статистика:**
 Всего целей: {stats['total_goals']}
@@ -104,27 +124,21 @@ class GoalsHandler:
 Серия: 🔥 {stats['current_streak']} дней
 
 **Цели:**
-"""
+"""]
+        
+        # Одно "сейчас" на весь список
+        now = datetime.now(_UKRAINE_TZ)
         
         for goal in goals:
-            status_icons = {
-                "active": "🎯",
-                "completed": "✅",
-                "failed": "❌",
-                "paused": "⏸️"
-            }
-            
-            icon = status_icons.get(goal["status"], "")
+            icon = _STATUS_ICONS.get(goal["status"], "")
             progress_bar = self._get_progress_bar(goal["progress"])
             
             deadline_text = ""
             if goal.get("deadline"):
-                deadline = datetime.fromisoformat(goal["deadline"])
-                ukraine_tz = pytz.timezone('Europe/Kiev')
-                now = datetime.now(ukraine_tz)
+                deadline = _goal_datetime(goal, "deadline")
                 
                 if deadline.tzinfo is None:
-                    deadline = ukraine_tz.localize(deadline)
+                    deadline = _UKRAINE_TZ.localize(deadline)
                 
                 time_left = deadline - now
                 
@@ -136,12 +150,14 @@ class GoalsHandler:
                 elif time_left.days < 7:
                     deadline_text = f" 📅 {time_left.days}д"
             
-            response += f"\n{icon} #{goal['id']}: **{goal['title']}**\n"
-            response += f"   {progress_bar} {goal['progress']}%{deadline_text}\n"
+            parts.append(
+                f"\n{icon} #{goal['id']}: **{goal['title']}**\n"
+                f"   {progress_bar} {goal['progress']}%{deadline_text}\n"
+            )
         
-        response += f"\n\n💪 {await self.goals.get_motivation_message(user.id)}"
+        parts.append(f"\n\n💪 {await self.goals.get_motivation_message(user.id)}")
         
-        await update.message.reply_text(response, parse_mode="Markdown")
+        await update.message.reply_text("".join(parts), parse_mode="Markdown")
     
     async def goal_progress_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -281,7 +297,7 @@ class GoalsHandler:
         
         progress_bar = self._get_progress_bar(goal["progress"])
         
-        response = f"""📋 **Детали Цели**
+        parts = [f"""📋 **Детали Цели**
 
 🎯 #{goal['id']}: **{goal['title']}**
 
@@ -289,51 +305,51 @@ class GoalsHandler:
 **Тип:** {type_text.get(goal['type'], goal['type'])}
 **Прогресс:** {progress_bar} {goal['progress']}%
 
-**Создана:** {datetime.fromisoformat(goal['created_at']).strftime('%d.%m.%Y %H:%M')}
-**Обновлена:** {datetime.fromisoformat(goal['last_updated']).strftime('%d.%m.%Y %H:%M')}
-"""
+**Создана:** {_goal_datetime(goal, 'created_at').strftime('%d.%m.%Y %H:%M')}
+**Обновлена:** {_goal_datetime(goal, 'last_updated').strftime('%d.%m.%Y %H:%M')}
+"""]
         
         if goal.get("description"):
-            response += f"**Описание:** {goal['description']}\n"
+            parts.append(f"**Описание:** {goal['description']}\n")
         
         if goal.get("deadline"):
-            deadline = datetime.fromisoformat(goal["deadline"])
-            ukraine_tz = pytz.timezone('Europe/Kiev')
-            now = datetime.now(ukraine_tz)
+            deadline = _goal_datetime(goal, "deadline")
+            now = datetime.now(_UKRAINE_TZ)
             
             if deadline.tzinfo is None:
-                deadline = ukraine_tz.localize(deadline)
+                deadline = _UKRAINE_TZ.localize(deadline)
             
             time_left = deadline - now
             
             deadline_str = deadline.strftime('%d.%m.%Y %H:%M')
             
             if time_left.total_seconds() < 0:
-                response += f"**Дедлайн:** {deadline_str} ⚠️ Просрочен\n"
+                parts.append(f"**Дедлайн:** {deadline_str} ⚠️ Просрочен\n")
             else:
                 days = time_left.days
                 hours = int(time_left.seconds / 3600)
-                response += f"**Дедлайн:** {deadline_str}\n"
-                response += f"**Осталось:** {days}д {hours}ч\n"
+                parts.append(f"**Дедлайн:** {deadline_str}\n**Осталось:** {days}д {hours}ч\n")
         
         if goal.get("milestones"):
-            response += f"\n**Этапы:**\n"
-            for milestone in goal["milestones"]:
-                if milestone in goal.get("completed_milestones", []):
-                    response += f"✅ {milestone}\n"
-                else:
-                    response += f"⬜ {milestone}\n"
+            parts.append("\n**Этапы:**\n")
+            done = set(goal.get("completed_milestones") or ())
+            parts.extend(
+                f"{'✅' if milestone in done else '⬜'} {milestone}\n"
+                for milestone in goal["milestones"]
+            )
         
-        response += f"\n**Команды:**\n"
-        response += f"`/goal_progress {goal_id} <процент>` - обновить прогресс\n"
-        response += f"`/goal_complete {goal_id}` - отметить выполненной\n"
+        parts.append(
+            f"\n**Команды:**\n"
+            f"`/goal_progress {goal_id} <процент>` - обновить прогресс\n"
+            f"`/goal_complete {goal_id}` - отметить выполненной\n"
+        )
         
         if goal["status"] == "active":
-            response += f"`/goal_pause {goal_id}` - поставить на паузу\n"
+            parts.append(f"`/goal_pause {goal_id}` - поставить на паузу\n")
         elif goal["status"] == "paused":
-            response += f"`/goal_resume {goal_id}` - возобновить\n"
+            parts.append(f"`/goal_resume {goal_id}` - возобновить\n")
         
-        await update.message.reply_text(response, parse_mode="Markdown")
+        await update.message.reply_text("".join(parts), parse_mode="Markdown")
     
     async def goal_pause_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Ставит цель на паузу"""
@@ -405,7 +421,7 @@ class GoalsHandler:
             return
         
         # Визуализация процента выполнения
-        completion_bar = "█" * int(stats["completion_rate"] * 10) + "░" * (10 - int(stats["completion_rate"] * 10))
+        completion_bar = self._get_progress_bar(int(stats["completion_rate"] * 100))
         
         response = f"""📊 **Статистика Целей**
 
@@ -430,7 +446,5 @@ class GoalsHandler:
     
     def _get_progress_bar(self, progress: int) -> str:
         """Генерирует визуальный прогресс-бар"""
-        filled = int(progress / 10)
-        empty = 10 - filled
-        return "█" * filled + "░" * empty
+        return _PROGRESS_BARS[max(0, min(100, progress))]
 
@@ -1,72 +1,31 @@
 """
 Обработчики изображений
 """
+import asyncio
+import hashlib
 import random
+import re
+from typing import Awaitable, Callable, Iterator, Optional
+
+from cachetools import TTLCache
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ChatAction
 
 from services.vision_service import VisionService
 from services.ai_service import AIService
+from utils import SingleFlight
 
 
-class ImageHandler:
-    """Обработка изображений через Gemini Vision + DeepSeek улучшение"""
-    
-    # Живые сообщения от AIVE для разнообразия
-    GREETING_MESSAGES = [
-        "👋 AIVE на связи! Сейчас посмотрю...",
-        "🤖 Привет! Уже смотрю что тут...",
-        "👀 О, интересно! Смотрю...",
-        "💫 AIVE к вашим услугам! Изучаю фото...",
-        "✨ Дай взгляну на это..."
-    ]
-    
-    THINKING_MESSAGES = {
-        "describe": [
-            "🤔 Думаю над ответом...",
-            "💭 Формулирую описание...",
-            "✍️ Готовлю детальный ответ...",
-            "🎨 Оформляю информацию..."
-        ],
-        "ocr": [
-            "✍️ Сейчас всё красиво оформлю...",
-            "📝 Структурирую текст...",
-            "✨ Делаю читабельным...",
-            "🎯 Форматирую результат..."
-        ],
-        "code": [
-            "💡 Готовлю детальный анализ и рекомендации...",
-            "🔍 Ищу способы улучшить код...",
-            "📊 Оцениваю качество...",
-            "✅ Составляю рекомендации..."
-        ],
-        "chart": [
-            "🔍 Ищу тренды и делаю выводы...",
-            "📈 Анализирую данные...",
-            "💡 Готовлю инсайты...",
-            "📊 Формулирую рекомендации..."
-        ]
-    }
-    
-    def __init__(self, vision_service: VisionService, ai_service: AIService):
-        self.vision = vision_service
-        self.ai = ai_service
-    
-    async def _enhance_with_deepseek(self, gemini_result: str, analysis_type: str, user_question: str = None) -> str:
-        """
-        Улучшает результат от Gemini через DeepSeek
-        
-        Args:
-            gemini_result: Результат анализа от Gemini
-            analysis_type: Тип анализа (describe/ocr/code/chart)
-            user_question: Вопрос пользователя (если есть)
-        
-        Returns:
-            Улучшенный и структурированный ответ
-        """
-        prompts = {
-            "describe": """Ты получил описание изображения от другой AI модели. 
+# Ключевые слова в подписи, выбирающие режим анализа (проверяются по порядку)
+_OCR_RE = re.compile(r'текст|ocr|распознай|прочитай|text', re.IGNORECASE)
+_CODE_RE = re.compile(r'код|code|ошибка|bug|баг', re.IGNORECASE)
+_CHART_RE = re.compile(r'график|диаграмм|chart|graph|статистик', re.IGNORECASE)
+
+
+# Шаблоны доработки ответа Gemini через DeepSeek (по типу анализа)
+_ENHANCE_PROMPTS = {
+    "describe": """Ты получил описание изображения от другой AI модели. 
 Твоя задача - улучшить этот результат:
 1. Сделать текст более структурированным и читабельным
 2. Добавить интересные детали и контекст
@@ -80,7 +39,7 @@ class ImageHandler:
 
 Улучшенное описание:""",
 
-            "ocr": """Ты получил распознанный текст с изображения от OCR модели.
+    "ocr": """Ты получил распознанный текст с изображения от OCR модели.
 Твоя задача:
 1. Проверить и улучшить форматирование
 2. Исправить явные ошибки распознавания (если есть)
@@ -92,7 +51,7 @@ class ImageHandler:
 
 Улучшенный текст:""",
 
-            "code": """Ты получил анализ кода от другой AI. 
+    "code": """Ты получил анализ кода от другой AI. 
 Твоя задача - сделать анализ более полезным:
 1. Структурировать по категориям (функционал, ошибки, улучшения)
 2. Добавить конкретные рекомендации
@@ -105,7 +64,7 @@ class ImageHandler:
 
 Улучшенный анализ:""",
 
-            "chart": """Ты получил анализ графика/диаграммы от другой AI.
+    "chart": """Ты получил анализ графика/диаграммы от другой AI.
 Твоя задача - сделать анализ более профессиональным:
 1. Структурировать информацию четко
 2. Добавить численные оценки трендов
@@ -117,8 +76,119 @@ class ImageHandler:
 {result}
 
 Профессиональный анализ:"""
-        }
+}
+
+# Лимит Telegram на длину сообщения с запасом
+_CHUNK_SIZE = 4000
+
+
+def _chunks(text: str, size: int = _CHUNK_SIZE) -> Iterator[str]:
+    """Лениво режет текст на части, по возможности по переносу строки (не рвём Markdown посреди строки)"""
+    start = 0
+    while len(text) - start > size:
+        cut = text.rfind('\n', start, start + size)
+        if cut <= start:
+            yield text[start:start + size]
+            start += size
+        else:
+            yield text[start:cut]
+            start = cut + 1  # сам перенос не переносим в начало следующей части
+    yield text[start:]
+
+
+async def _set_status(message, text: str):
+    """Обновляет статусное сообщение; сбой Telegram не должен прерывать анализ"""
+    try:
+        await message.edit_text(text)
+    except Exception as e:
+        print(f"⚠️ Не удалось обновить статус: {e}")
+
+
+class ImageHandler:
+    """Обработка изображений через Gemini Vision + DeepSeek улучшение"""
+    
+    # Живые сообщения от AIVE для разнообразия
+    GREETING_MESSAGES = (
+        "👋 AIVE на связи! Сейчас посмотрю...",
+        "🤖 Привет! Уже смотрю что тут...",
+        "👀 О, интересно! Смотрю...",
+        "💫 AIVE к вашим услугам! Изучаю фото...",
+        "✨ Дай взгляну на это..."
+    )
+    
+    THINKING_MESSAGES = {
+        "describe": (
+            "🤔 Думаю над ответом...",
+            "💭 Формулирую описание...",
+            "✍️ Готовлю детальный ответ...",
+            "🎨 Оформляю информацию..."
+        ),
+        "ocr": (
+            "✍️ Сейчас всё красиво оформлю...",
+            "📝 Структурирую текст...",
+            "✨ Делаю читабельным...",
+            "🎯 Форматирую результат..."
+        ),
+        "code": (
+            "💡 Готовлю детальный анализ и рекомендации...",
+            "🔍 Ищу способы улучшить код...",
+            "📊 Оцениваю качество...",
+            "✅ Составляю рекомендации..."
+        ),
+        "chart": (
+            "🔍 Ищу тренды и делаю выводы...",
+            "📈 Анализирую данные...",
+            "💡 Готовлю инсайты...",
+            "📊 Формулирую рекомендации..."
+        )
+    }
+    
+    def __init__(self, vision_service: VisionService, ai_service: AIService):
+        self.vision = vision_service
+        self.ai = ai_service
+        
+        # (хэш фото, режим, вопрос) -> ответ Gemini; одно и то же фото (пересланный мем) не анализируем повторно
+        self._vision_cache = TTLCache(maxsize=256, ttl=600)
+        self._vision_flight = SingleFlight()  # одинаковые параллельные запросы - один запрос к Gemini
+    
+    async def _vision_cached(self, digest: str, mode: str, question: Optional[str],
+                             call: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """
+        Выполняет запрос к Gemini, объединяя одинаковые параллельные запросы в один
+        
+        Args:
+            digest: Хэш содержимого фото
+            mode: Режим анализа (describe/ocr/code/chart)
+            question: Вопрос пользователя (если есть)
+            call: Фабрика корутины запроса к VisionService
+        """
+        key = (digest, mode, question)
+        
+        result = self._vision_cache.get(key)
+        if result is not None:
+            return result
+        
+        async def load() -> Optional[str]:
+            result = await call()
+            # Ошибки VisionService возвращает строкой с ❌ — их не кэшируем
+            if result and not result.startswith("❌"):
+                self._vision_cache[key] = result
+            return result
+        
+        return await self._vision_flight.run(key, load)
+    
+    async def _enhance_with_deepseek(self, gemini_result: str, analysis_type: str, user_question: str = None) -> str:
+        """
+        Улучшает результат от Gemini через DeepSeek
         
+        Args:
+            gemini_result: Результат анализа от Gemini
+            analysis_type: Тип анализа (describe/ocr/code/chart)
+            user_question: Вопрос пользователя (если есть)
+        
+        Returns:
+            Улучшенный и структурированный ответ
+        """
         # Gemini дает отличные результаты, дополнительное улучшение через DeepSeek не нужно
         # Экономия: ~$0.28 за 1000 изображений! 💰
         return gemini_result
@@ -135,68 +205,81 @@ class ImageHandler:
         # Получаем подпись (если есть)
         caption = update.message.caption or ""
         
-        await update.message.reply_text(random.choice(self.GREETING_MESSAGES))
-        await update.message.chat.send_action(ChatAction.TYPING)
+        # Одно статусное сообщение, которое дальше редактируется по этапам
+        status, _ = await asyncio.gather(
+            update.message.reply_text(random.choice(self.GREETING_MESSAGES)),
+            update.message.chat.send_action(ChatAction.TYPING)
+        )
         
         try:
             # Скачиваем фото
             file = await context.bot.get_file(photo.file_id)
-            image_bytes = await file.download_as_bytearray()
+            # Один раз в неизменяемые bytes — дальше передаём без копий
+            image_bytes = bytes(await file.download_as_bytearray())
+            digest = hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
             
             # Определяем что нужно сделать на основе подписи
-            caption_lower = caption.lower()
-            
-            if any(word in caption_lower for word in ['текст', 'ocr', 'распознай', 'прочитай', 'text']):
+            if _OCR_RE.search(caption):
                 # OCR - распознавание текста
-                await update.message.reply_text("👀 Вглядываюсь в текст...")
-                gemini_result = await self.vision.ocr_image(bytes(image_bytes))
+                gemini_result, _ = await asyncio.gather(
+                    self._vision_cached(
+                        digest, "ocr", None, lambda: self.vision.ocr_image(image_bytes)
+                    ),
+                    _set_status(status, "👀 Вглядываюсь в текст...")
+                )
                 
-                await update.message.reply_text(random.choice(self.THINKING_MESSAGES["ocr"]))
+                await _set_status(status, random.choice(self.THINKING_MESSAGES["ocr"]))
                 result = await self._enhance_with_deepseek(gemini_result, "ocr")
                 response = f"📄 **Распознанный текст:**\n\n{result}"
             
-            elif any(word in caption_lower for word in ['код', 'code', 'ошибка', 'bug', 'баг']):
+            elif _CODE_RE.search(caption):
                 # Анализ кода
-                await update.message.reply_text("👨‍💻 Читаю код...")
-                gemini_result = await self.vision.analyze_code(bytes(image_bytes))
+                gemini_result, _ = await asyncio.gather(
+                    self._vision_cached(
+                        digest, "code", None, lambda: self.vision.analyze_code(image_bytes)
+                    ),
+                    _set_status(status, "👨‍💻 Читаю код...")
+                )
                 
-                await update.message.reply_text(random.choice(self.THINKING_MESSAGES["code"]))
+                await _set_status(status, random.choice(self.THINKING_MESSAGES["code"]))
                 result = await self._enhance_with_deepseek(gemini_result, "code")
                 response = f"💻 **Анализ кода:**\n\n{result}"
             
-            elif any(word in caption_lower for word in ['график', 'диаграмм', 'chart', 'graph', 'статистик']):
+            elif _CHART_RE.search(caption):
                 # Анализ графика
-                await update.message.reply_text("📊 Изучаю график...")
-                gemini_result = await self.vision.analyze_chart(bytes(image_bytes))
+                gemini_result, _ = await asyncio.gather(
+                    self._vision_cached(
+                        digest, "chart", None, lambda: self.vision.analyze_chart(image_bytes)
+                    ),
+                    _set_status(status, "📊 Изучаю график...")
+                )
                 
-                await update.message.reply_text(random.choice(self.THINKING_MESSAGES["chart"]))
+                await _set_status(status, random.choice(self.THINKING_MESSAGES["chart"]))
                 result = await self._enhance_with_deepseek(gemini_result, "chart")
                 response = f"📊 **Анализ графика:**\n\n{result}"
             
             else:
                 # Обычный анализ с вопросом или описание
-                await update.message.reply_text("👁️ Смотрю на изображение...")
-                gemini_result = await self.vision.analyze_image(
-                    bytes(image_bytes),
-                    question=caption if caption else None
+                question = caption if caption else None
+                gemini_result, _ = await asyncio.gather(
+                    self._vision_cached(
+                        digest, "describe", question,
+                        lambda: self.vision.analyze_image(image_bytes, question=question)
+                    ),
+                    _set_status(status, "👁️ Смотрю на изображение...")
                 )
                 
-                await update.message.reply_text(random.choice(self.THINKING_MESSAGES["describe"]))
+                await _set_status(status, random.choice(self.THINKING_MESSAGES["describe"]))
                 result = await self._enhance_with_deepseek(
                     gemini_result, 
                     "describe",
-                    user_question=caption if caption else None
+                    user_question=question
                 )
                 response = f"📸 **Анализ изображения:**\n\n{result}"
             
-            # Отправляем ответ
-            # Разбиваем на части если длинный
-            if len(response) > 4000:
-                parts = [response[i:i+4000] for i in range(0, len(response), 4000)]
-                for part in parts:
-                    await update.message.reply_text(part, parse_mode='Markdown')
-            else:
-                await update.message.reply_text(response, parse_mode='Markdown')
+            # Отправляем ответ (длинный — частями, строго по порядку)
+            for part in _chunks(response):
+                await update.message.reply_text(part, parse_mode='Markdown')
             
             print(f"✅ Обработано изображение от {user.first_name}")
             
@@ -4,6 +4,8 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from handlers.extras_handler import ExtrasHandler
+from handlers.utils_handler import UtilsHandler
 from keyboards import (
     get_main_menu,
     get_stats_menu,
@@ -14,104 +16,93 @@ from keyboards import (
 )
 
 
+# Кнопки-переходы: текст кнопки -> (ответ, клавиатура, parse_mode)
+_MENU_REPLIES = {
+    "🏠 Главное меню": ("📱 Главное меню:", get_main_menu, None),
+    "📊 Статистика": (
+        "📊 **Статистика работы**\n\n"
+        "Выбери команду:",
+        get_stats_menu, 'Markdown'
+    ),
+    "📝 Заметки": (
+        "📝 **Заметки и напоминания**\n\n"
+        "Выбери команду:",
+        get_notes_menu, 'Markdown'
+    ),
+    "🧠 Память": (
+        "🧠 **Долгосрочная память**\n\n"
+        "Выбери команду:",
+        get_memory_menu, 'Markdown'
+    ),
+    "🌤 Погода": (
+        "🌤 **Погода и курсы**\n\n"
+        "Выбери город или команду:",
+        get_info_menu, 'Markdown'
+    ),
+    "💬 Диалог": (
+        "💬 **Режим диалога**\n\n"
+        "Просто пиши мне сообщения!\n\n"
+        "Для сложных вопросов используй: `/think <вопрос>`\n"
+        "Для очистки истории: `/clear`",
+        get_main_menu, 'Markdown'
+    ),
+    "🎲 Игры": (
+        "🎲 **Игры и развлечения**\n\n"
+        "Выбери команду:",
+        get_games_menu, 'Markdown'
+    ),
+}
+
+# Кнопки-действия: текст кнопки -> имя метода MenuHandler (update, context)
+_MENU_ACTIONS = {
+    "💰 Курсы": "_show_rates",
+    "ℹ️ Помощь": "_show_help",
+}
+
+# Тексты всех кнопок, которые обрабатывает MenuHandler
+MENU_BUTTONS = frozenset(_MENU_REPLIES) | frozenset(_MENU_ACTIONS)
+
+# Все кнопки начинаются с эмодзи - обычный текст отсекаем одним startswith по префиксам
+_MENU_PREFIXES = tuple({label[:2] for label in MENU_BUTTONS})
+
+
 class MenuHandler:
     """Обработчик нажатий на кнопки меню"""
-    
+
+    def __init__(self, extras_handler: ExtrasHandler, utils_handler: UtilsHandler):
+        # Те же экземпляры, что обслуживают /rates и /help: общий кэш и кулдаун
+        self.extras_handler = extras_handler
+        self.utils_handler = utils_handler
+
+    async def _show_rates(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Кнопка курсов - вызываем команду rates"""
+        context.args = []
+        await self.extras_handler.rates_command(update, context)
+
+    async def _show_help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Кнопка помощи - показываем help"""
+        await self.utils_handler.help_command(update, context)
+
     async def handle_menu_button(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обрабатывает нажатия на кнопки меню"""
         text = update.message.text
-        
-        # Главное меню
-        if text == "🏠 Главное меню":
-            await update.message.reply_text(
-                "📱 Главное меню:",
-                reply_markup=get_main_menu()
-            )
-            return True
-        
-        # Переход в подменю
-        if text == "📊 Статистика":
-            await update.message.reply_text(
-                "📊 **Статистика работы**\n\n"
-                "Выбери команду:",
-                parse_mode='Markdown',
-                reply_markup=get_stats_menu()
-            )
-            return True
-        
-        if text == "📝 Заметки":
-            await update.message.reply_text(
-                "📝 **Заметки и напоминания**\n\n"
-                "Выбери команду:",
-                parse_mode='Markdown',
-                reply_markup=get_notes_menu()
-            )
-            return True
-        
-        if text == "🧠 Память":
-            await update.message.reply_text(
-                "🧠 **Долгосрочная память**\n\n"
-                "Выбери команду:",
-                parse_mode='Markdown',
-                reply_markup=get_memory_menu()
-            )
-            return True
-        
-        if text == "🌤 Погода":
-            await update.message.reply_text(
-                "🌤 **Погода и курсы**\n\n"
-                "Выбери город или команду:",
-                parse_mode='Markdown',
-                reply_markup=get_info_menu()
-            )
-            return True
-        
-        if text == "💬 Диалог":
-            await update.message.reply_text(
-                "💬 **Режим диалога**\n\n"
-                "Просто пиши мне сообщения!\n\n"
-                "Для сложных вопросов используй: `/think <вопрос>`\n"
-                "Для очистки истории: `/clear`",
-                parse_mode='Markdown',
-                reply_markup=get_main_menu()
-            )
-            return True
-        
-        if text == "💰 Курсы":
-            # Вызываем команду rates
-            context.args = []
-            from handlers.extras_handler import ExtrasHandler
-            from services.extras_service import ExtrasService
-            
-            extras_service = ExtrasService()
-            extras_handler = ExtrasHandler(extras_service)
-            await extras_handler.rates_command(update, context)
-            return True
-        
-        if text == "🎲 Игры":
+        if not text or not text.startswith(_MENU_PREFIXES):
+            return False
+
+        entry = _MENU_REPLIES.get(text)
+        if entry is not None:
+            reply, keyboard, parse_mode = entry
             await update.message.reply_text(
-                "🎲 **Игры и развлечения**\n\n"
-                "Выбери команду:",
-                parse_mode='Markdown',
-                reply_markup=get_games_menu()
+                reply,
+                parse_mode=parse_mode,
+                reply_markup=keyboard()
             )
             return True
-        
-        if text == "ℹ️ Помощь":
-            # Показываем help
-            from handlers.utils_handler import UtilsHandler
-            from database import Database
-            from services import MemoryService, AIService
-            import config
-            
-            db = Database(config.DATABASE_PATH)
-            ai = AIService()
-            memory = MemoryService(db, ai)
-            utils_handler = UtilsHandler(db, memory)
-            
-            await utils_handler.help_command(update, context)
+
+        action = _MENU_ACTIONS.get(text)
+        if action is not None:
+            await getattr(self, action)(update, context)
             return True
-        
+
         # Если не нажата кнопка меню, возвращаем False
         return False
-
@@ -1,15 +1,215 @@
 """
 Обработчики утилит: память, заметки, напоминания, система
 """
-from telegram import Update
+from telegram import LinkPreviewOptions, Update
 from telegram.ext import ContextTypes
 from telegram.constants import ChatAction
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+import logging
 import psutil
 import platform
+import pytz
+import re
 
 from database import Database
-from services import MemoryService
+from services import MemoryService, get_ai
+from services.ai_service import loads_json
+
+logger = logging.getLogger(__name__)
+
+
+_GB = 1024 ** 3
+
+_UKRAINE_TZ = pytz.timezone('Europe/Kiev')
+
+# Для ответов с пользовательским текстом: ссылки из заметок/фактов не разворачиваем в превью
+_NO_PREVIEW = LinkPreviewOptions(is_disabled=True)
+
+# Markdown-обёртка ```json ... ```, которую модель иногда добавляет вокруг JSON
+_JSON_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+# Первый вызов без интервала всегда 0.0 - запускаем отсчёт при импорте,
+# чтобы /system брал загрузку CPU с прошлого замера без блокирующего sleep
+psutil.cpu_percent(interval=None)
+
+# Неизменные за время работы процесса сведения о машине - считаем один раз
+_OS_NAME = platform.system()
+_OS_RELEASE = platform.release()
+_CPU_COUNT = psutil.cpu_count()
+_BOOT_TIME = datetime.fromtimestamp(psutil.boot_time())
+_MEM_TOTAL_GB = psutil.virtual_memory().total / _GB
+_DISK_TOTAL_GB = psutil.disk_usage('/').total / _GB
+
+# Шаблон /system - заполняется текущими значениями через format_map
+_SYSTEM_TEMPLATE = """🖥 **Информация о системе**
+
+💻 **ОС:** {os} {release}
+🔧 **Процессор:** {cpu_count} ядер
+📊 **Загрузка CPU:** {cpu_percent}%
+
+💾 **Память:**
+  • Всего: {mem_total:.1f} GB
+  • Использовано: {mem_used:.1f} GB ({mem_percent}%)
+  • Свободно: {mem_free:.1f} GB
+
+💿 **Диск:**
+  • Всего: {disk_total:.1f} GB
+  • Использовано: {disk_used:.1f} GB ({disk_percent}%)
+  • Свободно: {disk_free:.1f} GB
+
+⏱ **Аптайм:** {up_days}д {up_hours}ч {up_minutes}м
+"""
+
+_HELP_TEXT = """🤖 **Все команды AIVE**
+
+━━━━━━━━━━━━━━━━━━━━━
+
+**🤖 AI Агент (Проактивный):**
+/agent_start - Включить агента
+/agent_stop - Выключить агента  
+/agent_status - Статус агента
+/agent_help - Справка по агенту
+/smart_remind - Умное напоминание
+/smart_note - Умная заметка
+
+**📸 Изображения:**
+/ocr - Распознать текст
+/describe - Описать фото
+/photo - Справка по фото
+
+**🧠 ИИ и диалоги:**
+/clear - Очистить историю
+/summarize - Резюме разговора
+/think - Глубокий анализ
+
+**💭 Память:**
+/remember - Сохранить факт
+/recall - Показать память
+/forget - Удалить факт
+
+**📝 Заметки:**
+/note - Создать заметку
+/notes - Показать заметки
+/delnote - Удалить заметку
+
+**⏰ Напоминания:**
+/remind - Создать напоминание
+
+**📊 Работа:**
+/stats - Статистика с сайта
+/workers - Список работников
+/check - Проверить работника
+
+**🌍 Информация:**
+/weather - Погода
+/rates - Курсы валют
+/crypto - Крипто цена
+
+**🎮 Развлечения:**
+/fact - Интересный факт
+/joke - Шутка
+/quote - Мотивация
+/activity - Чем заняться
+/tips - Полезный совет
+
+**🎲 Игры:**
+/dice - Бросить кости
+/8ball - Магический шар
+/choose - Выбрать вариант
+
+**🖥 Система:**
+/system - Инфо о системе
+/help - Эта справка
+
+━━━━━━━━━━━━━━━━━━━━━
+
+💡 **Просто пиши - я пойму!**
+
+🤖 **AI Агент активен:**
+• Извлекаю задачи из диалога
+• Учусь на паттернах
+• Предлагаю помощь
+• Распознаю завершение задач
+
+✨ **Отправь фото** - проанализирую
+"""
+
+# Частые формулировки напоминаний, которые разбираем без запроса к AI
+_RE_IN = re.compile(r'^через\s+(\d+)\s*(мин\w*|час\w*)\s+(.+)$', re.IGNORECASE | re.DOTALL)
+_RE_TOMORROW = re.compile(r'^завтра(?:\s+в)?\s+(\d{1,2})[:.](\d{2})\s+(.+)$', re.IGNORECASE | re.DOTALL)
+_RE_DATE = re.compile(
+    r'^(\d{1,2})\.(\d{1,2})(?:\.(\d{2}|\d{4}))?\s+(?:в\s+)?(\d{1,2})[:.](\d{2})\s+(.+)$',
+    re.IGNORECASE | re.DOTALL
+)
+
+
+def _parse_reminder_locally(text: str) -> Optional[Tuple[datetime, str]]:
+    """
+    Разбирает "через N минут/часов", "завтра в HH:MM" и "DD.MM[.YYYY] в HH:MM"
+    
+    Returns:
+        tuple: (datetime в UTC, текст_напоминания) или None, если нужен AI
+    """
+    text = text.strip()
+    
+    match = _RE_IN.match(text)
+    if match:
+        amount, unit, reminder_text = match.groups()
+        minutes = int(amount) * (60 if unit.lower().startswith('час') else 1)
+        try:
+            return datetime.now(timezone.utc) + timedelta(minutes=minutes), reminder_text
+        except OverflowError:
+            # "через 99999999 часов" - дальше datetime.max, такое не разбираем
+            return None
+    
+    now = datetime.now(_UKRAINE_TZ)
+    
+    try:
+        match = _RE_TOMORROW.match(text)
+        if match:
+            hour, minute, reminder_text = match.groups()
+            day = (now + timedelta(days=1)).date()
+            local = datetime(day.year, day.month, day.day, int(hour), int(minute))
+        else:
+            match = _RE_DATE.match(text)
+            if not match:
+                return None
+            
+            day, month, year, hour, minute, reminder_text = match.groups()
+            if year is None:
+                year = now.year
+            elif len(year) == 2:
+                year = 2000 + int(year)
+            
+            local = datetime(int(year), int(month), int(day), int(hour), int(minute))
+            # Дата без года, которая в этом году уже прошла - значит следующий год
+            if match.group(3) is None and _UKRAINE_TZ.localize(local) <= now:
+                local = local.replace(year=local.year + 1)
+    except ValueError:
+        # 31.02, 25:00 и т.п. - пусть разбирается AI
+        return None
+    
+    remind_at = _UKRAINE_TZ.localize(local)
+    if remind_at <= now:
+        return None
+    
+    return remind_at.astimezone(timezone.utc), reminder_text
+
+
+def _payload(update: Update, skip: int = 0) -> str:
+    """Текст после команды и skip первых аргументов - срезом исходного сообщения, без склейки context.args"""
+    parts = (update.message.text or "").split(None, 1 + skip)
+    return parts[1 + skip] if len(parts) > 1 + skip else ""
+
+
+def _format_note_date(created_at: str) -> str:
+    """'YYYY-MM-DD HH:MM:SS' из SQLite -> 'DD.MM.YYYY HH:MM' срезами строки, без разбора в datetime"""
+    c = created_at
+    if len(c) >= 16 and c[4] == '-' and c[7] == '-' and c[13] == ':':
+        return f"{c[8:10]}.{c[5:7]}.{c[:4]} {c[11:16]}"
+    # Нестандартный формат - через datetime
+    return datetime.fromisoformat(c).strftime('%d.%m.%Y %H:%M')
 
 
 class UtilsHandler:
@@ -39,7 +239,7 @@ class UtilsHandler:
         
         category = context.args[0]
         key = context.args[1]
-        value = " ".join(context.args[2:])
+        value = _payload(update, skip=2)
         
         success = await self.memory.remember_fact(user.id, category, key, value)
         
@@ -49,7 +249,8 @@ class UtilsHandler:
                 f"📁 Категория: **{category}**\n"
                 f"🔑 Ключ: **{key}**\n"
                 f"📝 Значение: **{value}**",
-                parse_mode='Markdown'
+                parse_mode='Markdown',
+                link_preview_options=_NO_PREVIEW
             )
         else:
             await update.message.reply_text("❌ Не удалось сохранить.")
@@ -64,7 +265,7 @@ class UtilsHandler:
         
         memory_text = await self.memory.format_memory_for_display(user.id, category)
         
-        await update.message.reply_text(memory_text, parse_mode='Markdown')
+        await update.message.reply_text(memory_text, parse_mode='Markdown', link_preview_options=_NO_PREVIEW)
     
     async def forget_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -107,11 +308,12 @@ class UtilsHandler:
                 "📝 **Создать заметку:**\n"
                 "`/note <текст заметки>`\n\n"
                 "Пример:\n"
-                "`/note Не забыть купить молоко`"
+                "`/note Не забыть купить молоко`",
+                parse_mode='Markdown'
             )
             return
         
-        content = " ".join(context.args)
+        content = _payload(update)
         
         note_id = await self.db.add_note(user.id, content)
         
@@ -125,7 +327,7 @@ class UtilsHandler:
         """
         user = update.effective_user
         
-        search = " ".join(context.args) if context.args else None
+        search = _payload(update) if context.args else None
         
         notes = await self.db.get_notes(user.id, search)
         
@@ -133,17 +335,16 @@ class UtilsHandler:
             await update.message.reply_text("📭 Заметок нет.")
             return
         
-        message = f"📝 **Заметки** ({len(notes)}):\n\n"
+        parts = [f"📝 **Заметки** ({len(notes)}):\n\n"]
         
         for note in notes[:10]:  # Показываем только первые 10
-            date = datetime.fromisoformat(note['created_at']).strftime('%d.%m.%Y %H:%M')
-            message += f"**#{note['id']}** _{date}_\n"
-            message += f"{note['content'][:100]}\n\n"
+            date = _format_note_date(note['created_at'])
+            parts.append(f"**#{note['id']}** _{date}_\n{note['content'][:100]}\n\n")
         
         if len(notes) > 10:
-            message += f"_...и еще {len(notes) - 10} заметок_"
+            parts.append(f"_...и еще {len(notes) - 10} заметок_")
         
-        await update.message.reply_text(message, parse_mode='Markdown')
+        await update.message.reply_text("".join(parts), parse_mode='Markdown', link_preview_options=_NO_PREVIEW)
     
     async def delete_note_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -154,7 +355,8 @@ class UtilsHandler:
         if not context.args:
             await update.message.reply_text(
                 "🗑 **Удалить заметку:**\n"
-                "`/delnote <ID>`"
+                "`/delnote <ID>`",
+                parse_mode='Markdown'
             )
             return
         
@@ -195,18 +397,19 @@ class UtilsHandler:
         try:
             # Пробуем распарсить как число минут (старый формат)
             minutes = int(context.args[0])
-            text = " ".join(context.args[1:])
+            text = _payload(update, skip=1)
             
             # Используем UTC время (как в БД)
-            from datetime import timezone
             remind_at = datetime.now(timezone.utc) + timedelta(minutes=minutes)
             
         except ValueError:
-            # Не число - используем AI для парсинга естественного языка
-            full_text = " ".join(context.args)
-            await update.message.reply_text("🤔 Анализирую время...")
+            # Не число - сначала частые формулировки, остальное разбирает AI
+            full_text = _payload(update)
+            result = _parse_reminder_locally(full_text)
             
-            result = await self._parse_reminder_with_ai(full_text, user.id)
+            if result is None:
+                await update.message.reply_text("🤔 Анализирую время...")
+                result = await self._parse_reminder_with_ai(full_text, user.id)
             
             if not result:
                 await update.message.reply_text(
@@ -224,20 +427,23 @@ class UtilsHandler:
         reminder_id = await self.db.add_reminder(user.id, text, remind_at)
         
         # Для отображения конвертируем в локальное время
-        import pytz
-        ukraine_tz = pytz.timezone('Europe/Kiev')
-        local_time = remind_at.astimezone(ukraine_tz)
+        local_time = remind_at.astimezone(_UKRAINE_TZ)
         
         # Вычисляем разницу во времени
-        now_ukraine = datetime.now(ukraine_tz)
+        now_ukraine = datetime.now(_UKRAINE_TZ)
         time_delta = local_time - now_ukraine
         
-        if time_delta.days > 0:
-            time_str = f"через {time_delta.days}д {time_delta.seconds // 3600}ч"
-        elif time_delta.seconds >= 3600:
-            time_str = f"через {time_delta.seconds // 3600}ч {(time_delta.seconds % 3600) // 60}мин"
+        # Через total_seconds: у отрицательной дельты .seconds "заворачивается" на сутки
+        days, rest = divmod(max(0, int(time_delta.total_seconds())), 86400)
+        hours, rest = divmod(rest, 3600)
+        minutes = rest // 60
+        
+        if days:
+            time_str = f"через {days}д {hours}ч"
+        elif hours:
+            time_str = f"через {hours}ч {minutes}мин"
         else:
-            time_str = f"через {time_delta.seconds // 60}мин"
+            time_str = f"через {minutes}мин"
         
         await update.message.reply_text(
             f"⏰ <b>Напоминание создано!</b>\n\n"
@@ -245,10 +451,11 @@ class UtilsHandler:
             f"🕐 {local_time.strftime('%d.%m.%Y %H:%M')} (Киев)\n"
             f"⏱ {time_str}\n"
             f"🆔 #{reminder_id}",
-            parse_mode='HTML'
+            parse_mode='HTML',
+            link_preview_options=_NO_PREVIEW
         )
         
-        print(f"✅ Создано напоминание #{reminder_id}: {text} на {remind_at.isoformat()}")
+        logger.info("✅ Создано напоминание #%s: %s на %s", reminder_id, text, remind_at)
     
     async def _parse_reminder_with_ai(self, text: str, user_id: int):
         """
@@ -257,12 +464,8 @@ class UtilsHandler:
         Returns:
             tuple: (datetime, текст_напоминания) или None
         """
-        from datetime import timezone
-        import pytz
-        
         # Текущее время в Киеве для контекста
-        ukraine_tz = pytz.timezone('Europe/Kiev')
-        now = datetime.now(ukraine_tz)
+        now = datetime.now(_UKRAINE_TZ)
         
         prompt = f"""Сейчас: {now.strftime('%d.%m.%Y %H:%M')} (Киев, Украина)
 День недели: {now.strftime('%A')}
@@ -293,18 +496,15 @@ class UtilsHandler:
                 {"role": "user", "content": prompt}
             ]
             
-            from services import AIService
-            ai = AIService()
-            response = await ai.chat(messages, temperature=0.2, max_tokens=100, json_mode=True)  # Оптимизация: 200→100
+            response = await get_ai().chat(messages, temperature=0.2, max_tokens=100, json_mode=True)  # Оптимизация: 200→100
             
             if not response:
                 return None
             
-            import json
-            result = json.loads(response)
+            result = loads_json(_JSON_FENCE_RE.sub('', response.strip()))
             
             if "error" in result:
-                print(f"❌ AI не смог распарсить время: {result['error']}")
+                logger.warning("❌ AI не смог распарсить время: %s", result['error'])
                 return None
             
             minutes = result.get("minutes_from_now")
@@ -319,7 +519,7 @@ class UtilsHandler:
             return (remind_at, reminder_text)
             
         except Exception as e:
-            print(f"❌ Ошибка парсинга времени через AI: {e}")
+            logger.error("❌ Ошибка парсинга времени через AI: %s", e)
             return None
     
     # === СИСТЕМА ===
@@ -331,31 +531,29 @@ class UtilsHandler:
         await update.message.chat.send_action(ChatAction.TYPING)
         
         # Получаем информацию о системе
-        cpu_percent = psutil.cpu_percent(interval=1)
+        cpu_percent = psutil.cpu_percent(interval=None)
         memory = psutil.virtual_memory()
         disk = psutil.disk_usage('/')
         
-        boot_time = datetime.fromtimestamp(psutil.boot_time())
-        uptime = datetime.now() - boot_time
-        
-        message = f"""🖥 **Информация о системе**
-
-💻 **ОС:** {platform.system()} {platform.release()}
-🔧 **Процессор:** {psutil.cpu_count()} ядер
-📊 **Загрузка CPU:** {cpu_percent}%
-
-💾 **Память:**
-  • Всего: {memory.total / (1024**3):.1f} GB
-  • Использовано: {memory.used / (1024**3):.1f} GB ({memory.percent}%)
-  • Свободно: {memory.available / (1024**3):.1f} GB
-
-💿 **Диск:**
-  • Всего: {disk.total / (1024**3):.1f} GB
-  • Использовано: {disk.used / (1024**3):.1f} GB ({disk.percent}%)
-  • Свободно: {disk.free / (1024**3):.1f} GB
-
-⏱ **Аптайм:** {uptime.days}д {uptime.seconds // 3600}ч {(uptime.seconds % 3600) // 60}м
-"""
+        uptime = datetime.now() - _BOOT_TIME
+        
+        message = _SYSTEM_TEMPLATE.format_map({
+            "os": _OS_NAME,
+            "release": _OS_RELEASE,
+            "cpu_count": _CPU_COUNT,
+            "cpu_percent": cpu_percent,
+            "mem_total": _MEM_TOTAL_GB,
+            "mem_used": memory.used / _GB,
+            "mem_percent": memory.percent,
+            "mem_free": memory.available / _GB,
+            "disk_total": _DISK_TOTAL_GB,
+            "disk_used": disk.used / _GB,
+            "disk_percent": disk.percent,
+            "disk_free": disk.free / _GB,
+            "up_days": uptime.days,
+            "up_hours": uptime.seconds // 3600,
+            "up_minutes": (uptime.seconds % 3600) // 60
+        })
         
         await update.message.reply_text(message, parse_mode='Markdown')
     
@@ -363,79 +561,5 @@ class UtilsHandler:
         """
         /help - показывает список команд
         """
-        help_text = """🤖 **Все команды AIVE**
-
-━━━━━━━━━━━━━━━━━━━━━
-
-**🤖 AI Агент (Проактивный):**
-/agent_start - Включить агента
-/agent_stop - Выключить агента  
-/agent_status - Статус агента
-/agent_help - Справка по агенту
-/smart_remind - Умное напоминание
-/smart_note - Умная заметка
-
-**📸 Изображения:**
-/ocr - Распознать текст
-/describe - Описать фото
-/photo - Справка по фото
-
-**🧠 ИИ и диалоги:**
-/clear - Очистить историю
-/summarize - Резюме разговора
-/think - Глубокий анализ
-
-**💭 Память:**
-/remember - Сохранить факт
-/recall - Показать память
-/forget - Удалить факт
-
-**📝 Заметки:**
-/note - Создать заметку
-/notes - Показать заметки
-/delnote - Удалить заметку
-
-**⏰ Напоминания:**
-/remind - Создать напоминание
-
-**📊 Работа:**
-/stats - Статистика с сайта
-/workers - Список работников
-/check - Проверить работника
-
-**🌍 Информация:**
-/weather - Погода
-/rates - Курсы валют
-/crypto - Крипто цена
-
-**🎮 Развлечения:**
-/fact - Интересный факт
-/joke - Шутка
-/quote - Мотивация
-/activity - Чем заняться
-/tips - Полезный совет
-
-**🎲 Игры:**
-/dice - Бросить кости
-/8ball - Магический шар
-/choose - Выбрать вариант
-
-**🖥 Система:**
-/system - Инфо о системе
-/help - Эта справка
-
-━━━━━━━━━━━━━━━━━━━━━
-
-💡 **Просто пиши - я пойму!**
-
-🤖 **AI Агент активен:**
-• Извлекаю задачи из диалога
-• Учусь на паттернах
-• Предлагаю помощь
-• Распознаю завершение задач
-
-✨ **Отправь фото** - проанализирую
-"""
-        
-        await update.message.reply_text(help_text, parse_mode='Markdown')
+        await update.message.reply_text(_HELP_TEXT, parse_mode='Markdown')
 
@@ -5,6 +5,9 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ChatAction
 from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict
+import asyncio
 
 from database import Database
 from services.work_parser_service import WorkParserService
@@ -14,6 +17,27 @@ class WorkHandler:
     def __init__(self, db: Database, parser: WorkParserService):
         self.db = db
         self.parser = parser
+        # Фоновые сохранения отчетов в БД (ссылки держим, чтобы задачи не собрал GC)
+        self._pending_saves = set()
+    
+    def _save_stats_in_background(self, user_id: int, stats: Dict[str, Any]):
+        """Сохраняет отчет в БД фоновой задачей - ответ пользователю её не ждёт"""
+        task = asyncio.create_task(self.db.save_work_stats(
+            user_id=user_id,
+            date=stats['date'],
+            total_records=stats['workers_count'],
+            total_sfs=stats['total_sfs'],
+            total_sch=stats['total_sch'],
+            workers_data=stats['workers']
+        ))
+        self._pending_saves.add(task)
+        task.add_done_callback(self._on_save_done)
+    
+    def _on_save_done(self, task: asyncio.Task):
+        """Снимает задачу сохранения из списка и сообщает об ошибке"""
+        self._pending_saves.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ Ошибка сохранения статистики в БД: {task.exception()}")
     
     async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
@@ -26,12 +50,13 @@ class WorkHandler:
         if context.args:
             date = context.args[0]
         
-        await update.message.reply_text("🔄 Получаю статистику с сайта...")
-        await update.message.chat.send_action(ChatAction.TYPING)
-        
         try:
-            # Парсим данные
-            stats = await self.parser.parse_reports(report_date=date)
+            # Статус, индикатор печати и парсинг - параллельно: пользователь видит ответ сразу
+            _, _, stats = await asyncio.gather(
+                update.message.reply_text("🔄 Получаю статистику с сайта..."),
+                update.message.chat.send_action(ChatAction.TYPING),
+                self.parser.parse_reports(report_date=date)
+            )
             
             if not stats or not stats.get('success'):
                 await update.message.reply_text(
@@ -39,18 +64,11 @@ class WorkHandler:
                 )
                 return
             
-            # Сохраняем в БД
-            await self.db.save_work_stats(
-                user_id=user.id,
-                date=stats['date'],
-                total_records=stats['workers_count'],
-                total_sfs=stats['total_sfs'],
-                total_sch=stats['total_sch'],
-                workers_data=stats['workers']
-            )
+            # Сохраняем в БД в фоне
+            self._save_stats_in_background(user.id, stats)
             
             # Формируем официальный отчет с HTML форматированием
-            message = f"""<b>📊 ОТЧЕТ ПО РАБОТЕ СОТРУДНИКОВ</b>
+            parts = [f"""<b>📊 ОТЧЕТ ПО РАБОТЕ СОТРУДНИКОВ</b>
 📅 Дата: <b>{stats['date']}</b>
 👥 Команда: <b>{stats['team']}</b>
 
@@ -61,21 +79,15 @@ class WorkHandler:
 • SCH (проверено): <b>{stats['total_sch']}</b>
 • ⚠️ Скам-ассистенты: <b>{stats['scam_detected']} из {stats['workers_count']}</b>
 
-<b>Работники (сортировка по SFS):</b>"""
-            
-            # Сортируем ВСЕХ работников
-            sorted_workers = sorted(
-                stats['workers'], 
-                key=lambda x: x.get('sfs', 0), 
-                reverse=True
-            )
+<b>Работники (сортировка по SFS):</b>"""]
             
-            for i, worker in enumerate(sorted_workers, 1):
+            # Парсер уже отдаёт работников по убыванию SFS
+            for i, worker in enumerate(stats['workers'], 1):
                 scam_marker = " <b>⚠️[СКАМ]</b>" if worker.get('has_scam') else ""
-                message += f"\n{i}. <b>{worker['name']}</b>{scam_marker}"
-                message += f"\n   SFS: {worker.get('sfs', 0)} | Only Now: {worker.get('only_now', 0)} | SCH: {worker.get('sch', 0)}"
+                parts.append(f"{i}. <b>{worker['name']}</b>{scam_marker}")
+                parts.append(f"   SFS: {worker.get('sfs', 0)} | Only Now: {worker.get('only_now', 0)} | SCH: {worker.get('sch', 0)}")
             
-            await update.message.reply_text(message, parse_mode='HTML')
+            await update.message.reply_text("\n".join(parts), parse_mode='HTML')
             
         except Exception as e:
             print(f"❌ Ошибка при получении статистики: {e}")
@@ -94,10 +106,11 @@ class WorkHandler:
         if context.args:
             team_filter = " ".join(context.args)
         
-        await update.message.chat.send_action(ChatAction.TYPING)
-        
         try:
-            stats = await self.parser.parse_reports()
+            _, stats = await asyncio.gather(
+                update.message.chat.send_action(ChatAction.TYPING),
+                self.parser.parse_reports()
+            )
             
             if not stats or not stats.get('success'):
                 await update.message.reply_text(f"❌ Не удалось получить данные. {stats.get('error', '')}")
@@ -114,17 +127,19 @@ class WorkHandler:
                 return
             
             # Формируем сообщение с HTML форматированием
-            message = f"👥 <b>Список работников</b> ({len(workers)})\n\n"
+            parts = [f"👥 <b>Список работников</b> ({len(workers)})\n\n"]
             
             for worker in workers[:20]:  # Ограничиваем 20 для читаемости
                 team_emoji = "💚" if "Good Bunny" in worker.get('team', '') else "💙"
-                message += f"{team_emoji} <b>{worker['name']}</b> {worker.get('username', '')}\n"
-                message += f"   SFS: {worker.get('sfs', 0)} | SCH: {worker.get('sch', 0)}\n"
+                parts.append(
+                    f"{team_emoji} <b>{worker['name']}</b> {worker.get('username', '')}\n"
+                    f"   SFS: {worker.get('sfs', 0)} | SCH: {worker.get('sch', 0)}\n"
+                )
             
             if len(workers) > 20:
-                message += f"\n<i>...и еще {len(workers) - 20} работников</i>"
+                parts.append(f"\n<i>...и еще {len(workers) - 20} работников</i>")
             
-            await update.message.reply_text(message, parse_mode='HTML')
+            await update.message.reply_text("".join(parts), parse_mode='HTML')
             
         except Exception as e:
             print(f"❌ Ошибка: {e}")
@@ -142,21 +157,18 @@ class WorkHandler:
         
         worker_name = " ".join(context.args)
         
-        await update.message.chat.send_action(ChatAction.TYPING)
-        
         try:
-            stats = await self.parser.parse_reports()
+            _, stats = await asyncio.gather(
+                update.message.chat.send_action(ChatAction.TYPING),
+                self.parser.parse_reports()
+            )
             
             if not stats or not stats.get('success'):
                 await update.message.reply_text(f"❌ Не удалось получить данные. {stats.get('error', '')}")
                 return
             
-            # Ищем работника
-            found = None
-            for worker in stats['workers']:
-                if worker_name.lower() in worker['name'].lower():
-                    found = worker
-                    break
+            # Ищем работника: сначала точное имя, затем вхождение подстроки
+            found = self.parser.find_worker(stats, worker_name)
             
             if not found:
                 await update.message.reply_text(
@@ -203,31 +215,41 @@ class WorkHandler:
         
         try:
             # Ищем скриншот в data/screenshots
-            from pathlib import Path
             screenshots_dir = Path("data/screenshots")
             
             if not screenshots_dir.exists():
                 await update.message.reply_text("❌ Папка со скриншотами не найдена.")
                 return
             
-            # Ищем файлы со скриншотами работника
-            screenshots = list(screenshots_dir.glob(f"*{worker_name}*.png"))
+            # Ищем файлы со скриншотами работника (обход папки - в потоке, не блокируя цикл)
+            screenshots = await asyncio.to_thread(
+                lambda: list(screenshots_dir.glob(f"*{worker_name}*.png"))
+            )
             
             if not screenshots:
                 await update.message.reply_text(f"❌ Скриншоты для работника '{worker_name}' не найдены.")
                 return
             
-            # Отправляем все найденные скриншоты
-            for screenshot_path in screenshots:
-                with open(screenshot_path, 'rb') as photo:
-                    await update.message.reply_photo(
-                        photo=photo,
-                        caption=f"📸 Скриншот: {screenshot_path.name}"
-                    )
+            # Отправляем по очереди: Telegram показывает фото в порядке получения,
+            # а ошибка одного файла не отменяет остальные
+            sent = 0
+            for path in screenshots:
+                try:
+                    await self._send_screenshot(update, path)
+                    sent += 1
+                except Exception as e:
+                    print(f"❌ Ошибка отправки скриншота {path.name}: {e}")
             
-            await update.message.reply_text(f"✅ Отправлено скриншотов: {len(screenshots)}")
+            await update.message.reply_text(f"✅ Отправлено скриншотов: {sent} из {len(screenshots)}")
             
         except Exception as e:
             print(f"❌ Ошибка отправки скриншота: {e}")
             await update.message.reply_text("❌ Произошла ошибка при отправке скриншота.")
-
+    
+    async def _send_screenshot(self, update: Update, screenshot_path: Path):
+        """Читает файл скриншота в потоке и отправляет его фото"""
+        photo = await asyncio.to_thread(screenshot_path.read_bytes)
+        await update.message.reply_photo(
+            photo=photo,
+            caption=f"📸 Скриншот: {screenshot_path.name}"
+        )
@@ -1,14 +1,15 @@
 """
 Клавиатуры для Telegram бота
+
+Разметка неизменяемая (объекты PTB v20+ заморожены), поэтому каждая
+клавиатура строится один раз при импорте и дальше переиспользуется.
 """
 from telegram import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
 
 
-def get_main_menu():
-    """
-    Главное меню с кнопками быстрого доступа
-    """
-    keyboard = [
+# Главное меню с кнопками быстрого доступа
+_MAIN_MENU = ReplyKeyboardMarkup(
+    [
         [
             KeyboardButton("💬 Диалог"),
             KeyboardButton("📊 Статистика"),
@@ -25,20 +26,14 @@ def get_main_menu():
             KeyboardButton("🎲 Игры"),
             KeyboardButton("ℹ️ Помощь"),
         ],
-    ]
-    
-    return ReplyKeyboardMarkup(
-        keyboard,
-        resize_keyboard=True,
-        input_field_placeholder="Выбери команду или напиши сообщение..."
-    )
+    ],
+    resize_keyboard=True,
+    input_field_placeholder="Выбери команду или напиши сообщение..."
+)
 
-
-def get_stats_menu():
-    """
-    Меню статистики
-    """
-    keyboard = [
+# Меню статистики
+_STATS_MENU = ReplyKeyboardMarkup(
+    [
         [
             KeyboardButton("/stats"),
             KeyboardButton("/workers"),
@@ -47,19 +42,13 @@ def get_stats_menu():
             KeyboardButton("/check"),
             KeyboardButton("🏠 Главное меню"),
         ],
-    ]
-    
-    return ReplyKeyboardMarkup(
-        keyboard,
-        resize_keyboard=True
-    )
-
+    ],
+    resize_keyboard=True
+)
 
-def get_notes_menu():
-    """
-    Меню заметок
-    """
-    keyboard = [
+# Меню заметок
+_NOTES_MENU = ReplyKeyboardMarkup(
+    [
         [
             KeyboardButton("/note"),
             KeyboardButton("/notes"),
@@ -68,19 +57,13 @@ def get_notes_menu():
             KeyboardButton("/remind"),
             KeyboardButton("🏠 Главное меню"),
         ],
-    ]
-    
-    return ReplyKeyboardMarkup(
-        keyboard,
-        resize_keyboard=True
-    )
+    ],
+    resize_keyboard=True
+)
 
-
-def get_memory_menu():
-    """
-    Меню памяти
-    """
-    keyboard = [
+# Меню памяти
+_MEMORY_MENU = ReplyKeyboardMarkup(
+    [
         [
             KeyboardButton("/remember"),
             KeyboardButton("/recall"),
@@ -89,19 +72,13 @@ def get_memory_menu():
             KeyboardButton("/forget"),
             KeyboardButton("🏠 Главное меню"),
         ],
-    ]
-    
-    return ReplyKeyboardMarkup(
-        keyboard,
-        resize_keyboard=True
-    )
+    ],
+    resize_keyboard=True
+)
 
-
-def get_info_menu():
-    """
-    Меню информации
-    """
-    keyboard = [
+# Меню информации
+_INFO_MENU = ReplyKeyboardMarkup(
+    [
         [
             KeyboardButton("/weather Київ"),
             KeyboardButton("/weather Харків"),
@@ -113,19 +90,13 @@ def get_info_menu():
         [
             KeyboardButton("🏠 Главное меню"),
         ],
-    ]
-    
-    return ReplyKeyboardMarkup(
-        keyboard,
-        resize_keyboard=True
-    )
-
+    ],
+    resize_keyboard=True
+)
 
-def get_games_menu():
-    """
-    Меню игр и развлечений
-    """
-    keyboard = [
+# Меню игр и развлечений
+_GAMES_MENU = ReplyKeyboardMarkup(
+    [
         [
             KeyboardButton("/joke"),
             KeyboardButton("/quote"),
@@ -141,17 +112,57 @@ def get_games_menu():
         [
             KeyboardButton("🏠 Главное меню"),
         ],
-    ]
-    
-    return ReplyKeyboardMarkup(
-        keyboard,
-        resize_keyboard=True
-    )
+    ],
+    resize_keyboard=True
+)
+
+_REMOVE_KEYBOARD = ReplyKeyboardRemove()
+
+
+def get_main_menu():
+    """
+    Главное меню с кнопками быстрого доступа
+    """
+    return _MAIN_MENU
+
+
+def get_stats_menu():
+    """
+    Меню статистики
+    """
+    return _STATS_MENU
+
+
+def get_notes_menu():
+    """
+    Меню заметок
+    """
+    return _NOTES_MENU
+
+
+def get_memory_menu():
+    """
+    Меню памяти
+    """
+    return _MEMORY_MENU
+
+
+def get_info_menu():
+    """
+    Меню информации
+    """
+    return _INFO_MENU
+
+
+def get_games_menu():
+    """
+    Меню игр и развлечений
+    """
+    return _GAMES_MENU
 
 
 def remove_keyboard():
     """
     Удаляет клавиатуру
     """
-    return ReplyKeyboardRemove()
-
+    return _REMOVE_KEYBOARD
@@ -101,19 +101,21 @@ class TelegramBot:
         self.dtek = DTEKMonitorService(self.db)
         
         # Инициализируем обработчики
+        self.utils_handler = UtilsHandler(self.db, self.memory)
+        self.extras_handler = ExtrasHandler(self.extras)
+        # Кнопки меню вызывают те же обработчики, что и команды
+        self.menu_handler = MenuHandler(self.extras_handler, self.utils_handler)
         self.ai_handler = AIHandler(
             db=self.db, 
             ai=self.ai, 
             memory=self.memory,
+            menu_handler=self.menu_handler,
             extras_service=self.extras,
             parser_service=self.parser,
             agent_service=self.agent,  # Передаем агента для расширенной проактивности
             personality_service=self.personality  # Передаем личность для отслеживания активности
         )
         self.work_handler = WorkHandler(self.db, self.parser)
-        self.utils_handler = UtilsHandler(self.db, self.memory)
-        self.extras_handler = ExtrasHandler(self.extras)
-        self.menu_handler = MenuHandler()
         self.image_handler = ImageHandler(self.vision, self.ai)
         self.agent_handler = AgentHandler(self.agent)
         self.content_handler = ContentHandler(self.db, self.content_library)
@@ -589,6 +591,11 @@ class TelegramBot:
                 loop = asyncio.new_event_loop()
                 asyncio.set_event_loop(loop)
             
+            # Python 3.12+: задачи стартуют сразу, без лишнего круга через цикл,
+            # если корутина завершается до первого реального ожидания
+            if hasattr(asyncio, "eager_task_factory"):
+                loop.set_task_factory(asyncio.eager_task_factory)
+            
             # Инициализируем БД
             loop.run_until_complete(init_db_async())
             
@@ -609,6 +616,15 @@ def main():
     # Фикс для Windows - используем ProactorEventLoop
     if sys.platform == "win32":
         asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+    else:
+        # uvloop (опционально) - более быстрый event loop для Linux/macOS
+        try:
+            import uvloop
+            
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            logger.info("✅ Используется uvloop")
+        except ImportError:
+            pass
     
     bot = TelegramBot()
     
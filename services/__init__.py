@@ -13,6 +13,7 @@ from .extras_service import ExtrasService
 from .work_parser_service import WorkParserService
 from .personality_service import PersonalityService
 from .content_library_service import ContentLibraryService
+from ._singletons import get_ai
 
 __all__ = [
     "AIService",
@@ -26,6 +27,7 @@ __all__ = [
     "ExtrasService", 
     "WorkParserService", 
     "PersonalityService", 
-    "ContentLibraryService"
+    "ContentLibraryService",
+    "get_ai"
 ]
 
@@ -0,0 +1,12 @@
+"""
+Общие на весь процесс экземпляры сервисов
+"""
+from functools import lru_cache
+
+from .ai_service import AIService
+
+
+@lru_cache(maxsize=1)
+def get_ai() -> AIService:
+    """Общий AIService для обработчиков, которым не передали свой экземпляр"""
+    return AIService()
@@ -8,6 +8,21 @@ import json
 from typing import List, Dict, Optional, AsyncIterator, Any
 import config
 
+# orjson сериализует тело запроса в 3-5 раз быстрее и сразу в bytes (опционально)
+try:
+    import orjson
+    
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    
+    _loads = json.loads
+
+# Разбор JSON-ответов модели для обработчиков (тот же orjson с запасным json)
+loads_json = _loads
+
 
 class AIService:
     """
@@ -85,12 +100,12 @@ class AIService:
             async with aiohttp.ClientSession() as session:
                 async with session.post(
                     self.api_url,
-                    json=payload,
+                    data=_dumps(payload),
                     headers=headers,
                     timeout=aiohttp.ClientTimeout(total=120)  # Больше для reasoning
                 ) as response:
                     if response.status == 200:
-                        data = await response.json()
+                        data = await response.json(loads=_loads)
                         
                         # Проверяем наличие reasoning content (для deepseek-reasoner)
                         message = data['choices'][0]['message']
@@ -123,6 +138,97 @@ class AIService:
             print(f"❌ DeepSeek API Exception: {e}")
             return None
     
+    async def chat_stream(self,
+                          messages: List[Dict[str, str]],
+                          temperature: float = 0.7,
+                          max_tokens: int = 2000,
+                          use_reasoning: bool = False) -> AsyncIterator[str]:
+        """
+        Потоковый запрос к DeepSeek API (SSE)
+        
+        Отдаёт куски текста по мере генерации. Склеенные куски дают ту же
+        строку, что и chat(): для reasoning mode с заголовками
+        "Процесс рассуждения" и "Ответ".
+        
+        Args:
+            messages: Список сообщений
+            temperature: Температура генерации (0.0-2.0)
+            max_tokens: Максимум токенов в ответе
+            use_reasoning: Использовать deepseek-reasoner (thinking mode)
+            
+        Yields:
+            Очередной кусок ответа
+            
+        Raises:
+            Исключение сети или таймаут, если поток оборвался на середине:
+            вызывающий код не должен принимать обрезанный ответ за полный
+        """
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        payload = {
+            "model": self.reasoning_model if use_reasoning else self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True
+        }
+        
+        reasoning_started = False
+        answer_started = False
+        finished = False
+        
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(
+                    self.api_url,
+                    data=_dumps(payload),
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=120)
+                ) as response:
+                    if response.status != 200:
+                        error_text = await response.text()
+                        print(f"❌ DeepSeek API Error: {response.status} - {error_text}")
+                        return
+                    
+                    # Формат SSE: строки "data: {json}", в конце "data: [DONE]"
+                    async for raw_line in response.content:
+                        line = raw_line.strip()
+                        if not line.startswith(b"data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == b"[DONE]":
+                            finished = True
+                            break
+                        
+                        delta = _loads(data)['choices'][0].get('delta', {})
+                        
+                        reasoning = delta.get('reasoning_content')
+                        if reasoning:
+                            if not reasoning_started:
+                                reasoning_started = True
+                                yield "🤔 Процесс рассуждения:\n"
+                            yield reasoning
+                        
+                        content = delta.get('content')
+                        if content:
+                            if reasoning_started and not answer_started:
+                                yield "\n\n💡 Ответ:\n"
+                            answer_started = True
+                            yield content
+                    
+                    if not finished:
+                        raise ConnectionError("поток закрыт до [DONE]")
+                            
+        except asyncio.TimeoutError:
+            print("❌ DeepSeek API Timeout")
+            raise
+        except Exception as e:
+            print(f"❌ DeepSeek API Exception: {e}")
+            raise
+    
     async def chat_with_context(self, user_message: str, 
                                 context_messages: List[Dict[str, str]],
                                 system_prompt: str = None) -> Optional[str]:
@@ -191,6 +297,34 @@ class AIService:
         Returns:
             Ответ с процессом рассуждения
         """
+        messages = self._build_reasoning_messages(user_message, context_messages, system_prompt)
+        
+        # Используем reasoning mode
+        return await self.chat(messages, temperature=0.7, use_reasoning=True, max_tokens=4000)
+    
+    async def reasoning_chat_stream(self, user_message: str,
+                                    context_messages: List[Dict[str, str]] = None,
+                                    system_prompt: str = None) -> AsyncIterator[str]:
+        """
+        Потоковая версия reasoning_chat: отдаёт рассуждение и ответ по мере генерации
+        
+        Args:
+            user_message: Вопрос или задача
+            context_messages: История (опционально)
+            system_prompt: Системный промпт
+            
+        Yields:
+            Очередной кусок ответа
+        """
+        messages = self._build_reasoning_messages(user_message, context_messages, system_prompt)
+        
+        async for chunk in self.chat_stream(messages, temperature=0.7, use_reasoning=True, max_tokens=4000):
+            yield chunk
+    
+    def _build_reasoning_messages(self, user_message: str,
+                                  context_messages: List[Dict[str, str]] = None,
+                                  system_prompt: str = None) -> List[Dict[str, str]]:
+        """Собирает сообщения для reasoning mode"""
         messages = []
         
         # Системный промпт
@@ -213,8 +347,7 @@ class AIService:
         # Вопрос
         messages.append({"role": "user", "content": user_message})
         
-        # Используем reasoning mode
-        return await self.chat(messages, temperature=0.7, use_reasoning=True, max_tokens=4000)
+        return messages
     
     async def extract_json(self, text: str, schema_description: str) -> Optional[Dict]:
         """
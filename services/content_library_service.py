@@ -4,7 +4,8 @@
 """
 import re
 import json
-from typing import Optional, Dict, List, Tuple
+from operator import itemgetter
+from typing import Optional, Dict, Tuple, Union, AsyncIterator
 from pathlib import Path
 
 from database import Database
@@ -50,6 +51,9 @@ class ContentLibraryService:
         "other": "📂 Другое"
     }
     
+    # Эмодзи категорий (первый токен названия), чтобы не делать split на каждый ответ
+    CATEGORY_EMOJI = {key: name.split(" ", 1)[0] for key, name in CATEGORIES.items()}
+    
     # Расширения файлов для определения типа
     CODE_EXTENSIONS = {'.py', '.js', '.ts', '.jsx', '.tsx', '.java', '.cpp', '.c', '.h', '.cs', 
                       '.php', '.rb', '.go', '.rs', '.swift', '.kt', '.sql', '.sh', '.bash'}
@@ -79,19 +83,35 @@ class ContentLibraryService:
         # Анализируем контент через AI
         analysis = await self._analyze_content(content_type, **kwargs)
         
+        content_id = await self.save_with_analysis(user_id, content_type, analysis, **kwargs)
+        
+        return content_id, analysis
+    
+    async def save_with_analysis(
+        self,
+        user_id: int,
+        content_type: str,
+        analysis: Dict,
+        **kwargs
+    ) -> int:
+        """
+        Сохраняет контент в библиотеку с уже готовым AI анализом (без запроса к AI)
+        
+        Returns:
+            ID записи
+        """
         # Убираем image_bytes из kwargs (не нужен для БД)
         db_kwargs = {k: v for k, v in kwargs.items() if k != 'image_bytes'}
         
-        # Сохраняем в БД
-        content_id = await self.db.save_content(
+        # Сохраняем в БД сразу с уточнённым AI типом (text → code),
+        # чтобы не обновлять запись вторым запросом
+        return await self.db.save_content(
             user_id=user_id,
-            content_type=content_type,
+            content_type=analysis.get('content_type', content_type),
             description=analysis.get('description'),
             category=analysis.get('category'),
             **db_kwargs
         )
-        
-        return content_id, analysis
     
     async def _analyze_content(
         self,
@@ -99,7 +119,7 @@ class ContentLibraryService:
         file_id: str = None,
         url: str = None,
         text_content: str = None,
-        image_bytes: bytes = None,
+        image_bytes: Union[bytes, bytearray] = None,
         file_name: str = None,
         **kwargs
     ) -> Dict:
@@ -254,30 +274,34 @@ class ContentLibraryService:
             "tags": [self._extract_domain(url)]
         }
     
-    async def smart_search(self, user_id: int, query: str) -> List[Dict]:
+    async def smart_search(self, user_id: int, query: str, limit: Optional[int] = None) -> AsyncIterator[Dict]:
         """
         Умный поиск по библиотеке контента с AI пониманием
         
         Args:
             user_id: ID пользователя
             query: Запрос на естественном языке ("дай карту метро", "покажи смешные видео")
+            limit: Верхняя граница числа результатов (сколько реально покажем)
             
-        Returns:
-            Список найденного контента
+        Yields:
+            Найденный контент по мере чтения из БД
         """
         # AI понимает что ищет пользователь
         search_params = await self._parse_search_query(query)
         
+        db_limit = search_params.get('limit', 20)
+        if limit is not None:
+            db_limit = min(db_limit, limit)
+        
         # Ищем в БД
-        results = await self.db.get_content(
+        async for item in self.db.iter_content(
             user_id=user_id,
             content_type=search_params.get('content_type'),
             category=search_params.get('category'),
             search=search_params.get('keywords'),
-            limit=search_params.get('limit', 20)
-        )
-        
-        return results
+            limit=db_limit
+        ):
+            yield item
     
     async def _parse_search_query(self, query: str) -> Dict:
         """
@@ -404,14 +428,14 @@ class ContentLibraryService:
         result += f"📊 <b>Всего элементов:</b> {total}\n\n"
         
         result += "<b>По типам:</b>\n"
-        for content_type, count in sorted(stats.items(), key=lambda x: -x[1]):
+        for content_type, count in sorted(stats.items(), key=itemgetter(1), reverse=True):
             icon = type_icons.get(content_type, "📁")
             result += f"{icon} {content_type.title()}: {count}\n"
         
         if categories:
             result += f"\n<b>Категории:</b>\n"
             for cat in categories[:8]:  # Топ 8 категорий
-                emoji = self.CATEGORIES.get(cat, "📂").split()[0]
+                emoji = self.CATEGORY_EMOJI.get(cat, "📂")
                 result += f"{emoji} {cat.title()} "
             if len(categories) > 8:
                 result += f"\n+ еще {len(categories) - 8}"
@@ -6,26 +6,45 @@
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 import asyncio
+import time
 import pytz
 from services.parsers.parser_factory import ParserFactory
+from utils import SingleFlight
 import logging
 
 
 logger = logging.getLogger(__name__)
 
+# Сколько секунд график по адресу считается свежим (одинаков для всех пользователей адреса)
+_CACHE_TTL = {
+    "now": 20,
+    "today": 300,
+    "week": 1800
+}
+# Сколько секунд можно отдавать устаревший график, если ДТЕК недоступен
+_STALE_TTL = 6 * 3600
+
 
 class DTEKMonitorService:
     """
     Сервис для проактивного мониторинга отключений ДТЕК
     """
     
+    # Интервал проверки графика при мониторинге из бота (секунды)
+    DEFAULT_CHECK_INTERVAL = 1800
+    
     def __init__(self, db=None):
         self.db = db
         self.parser = None
         self.user_addresses = {}  # user_id -> address_config
         self.monitoring_tasks = {}  # user_id -> asyncio.Task
+        self.monitoring_intervals = {}  # user_id -> интервал проверки (сек)
         self.last_notifications = {}  # user_id -> {type: datetime}
         
+        # Кэш графиков: (city, street, building, queue, endpoint) -> (expires_at, stale_at, result)
+        self._schedule_cache = {}
+        self._schedule_flight = SingleFlight()  # параллельные запросы того же ключа - один запрос к ДТЕК
+        
     async def initialize_parser(self, address_config: Dict) -> bool:
         """
         Инициализирует парсер с адресом пользователя
@@ -61,6 +80,52 @@ class DTEKMonitorService:
             logger.error(f"❌ Parser initialization error: {e}")
             return False
     
+    @staticmethod
+    def _schedule_key(address: Dict, endpoint: str) -> tuple:
+        """Ключ кэша графика: адрес + тип запроса"""
+        return address["city"], address["street"], address["building"], address.get("queue"), endpoint
+    
+    def is_cached(self, user_id: int, endpoint: str) -> bool:
+        """Есть ли свежий график по адресу пользователя (ответ без запроса к ДТЕК)"""
+        address = self.user_addresses.get(user_id)
+        if not address:
+            return False
+        entry = self._schedule_cache.get(self._schedule_key(address, endpoint))
+        return entry is not None and time.monotonic() < entry[0]
+    
+    async def _cached(self, user_id: int, endpoint: str, fetch) -> Dict:
+        """
+        Отдаёт результат fetch(user_id) из кэша по адресу пользователя
+        
+        Параллельные запросы одного адреса ждут один запрос к ДТЕК (single-flight).
+        Если ДТЕК недоступен, отдаёт последний успешный результат
+        (не старше _STALE_TTL) с пометкой "stale": True.
+        """
+        address = self.user_addresses.get(user_id)
+        if not address:
+            return await fetch(user_id)
+        
+        key = self._schedule_key(address, endpoint)
+        
+        entry = self._schedule_cache.get(key)
+        if entry and time.monotonic() < entry[0]:
+            return entry[2]
+        
+        async def refresh() -> Dict:
+            result = await fetch(user_id)
+            now = time.monotonic()
+            
+            if result.get("success"):
+                self._schedule_cache[key] = (now + _CACHE_TTL[endpoint], now + _STALE_TTL, result)
+            elif entry and now < entry[1]:
+                logger.warning("⚠️ DTEK unavailable, serving cached %s for %s: %s",
+                               endpoint, address.get("street"), result.get("error"))
+                result = {**entry[2], "stale": True}
+            
+            return result
+        
+        return await self._schedule_flight.run(key, refresh)
+    
     async def get_current_status(self, user_id: int) -> Dict:
         """
         Получает текущий статус отключений
@@ -73,6 +138,18 @@ class DTEKMonitorService:
                 "today_shutdowns": ["14:00-14:30", "18:00-18:30"]
             }
         """
+        return await self._cached(user_id, "now", self._fetch_current_status)
+    
+    async def get_today_schedule(self, user_id: int) -> Dict:
+        """Получает график на сегодня"""
+        return await self._cached(user_id, "today", self._fetch_today_schedule)
+    
+    async def get_week_schedule(self, user_id: int) -> Dict:
+        """Получает график на неделю"""
+        return await self._cached(user_id, "week", self._fetch_week_schedule)
+    
+    async def _fetch_current_status(self, user_id: int) -> Dict:
+        """Запрашивает текущий статус у ДТЕК"""
         if not self.parser:
             address = self.user_addresses.get(user_id)
             if not address:
@@ -102,8 +179,8 @@ class DTEKMonitorService:
                 await self.parser.close()
                 self.parser = None
     
-    async def get_today_schedule(self, user_id: int) -> Dict:
-        """Получает график на сегодня"""
+    async def _fetch_today_schedule(self, user_id: int) -> Dict:
+        """Запрашивает график на сегодня у ДТЕК"""
         if not self.parser:
             address = self.user_addresses.get(user_id)
             if not address:
@@ -132,8 +209,8 @@ class DTEKMonitorService:
                 await self.parser.close()
                 self.parser = None
     
-    async def get_week_schedule(self, user_id: int) -> Dict:
-        """Получает график на неделю"""
+    async def _fetch_week_schedule(self, user_id: int) -> Dict:
+        """Запрашивает график на неделю у ДТЕК"""
         if not self.parser:
             address = self.user_addresses.get(user_id)
             if not address:
@@ -213,6 +290,21 @@ class DTEKMonitorService:
         """Получает адрес пользователя"""
         return self.user_addresses.get(user_id)
     
+    def get_user_state(self, user_id: int) -> Dict:
+        """
+        Снимок настроек и мониторинга пользователя
+        
+        Без await внутри - мониторинг не может измениться посреди чтения.
+        
+        Returns:
+            {"address": {...} | None, "is_monitoring": bool, "interval": 1800}
+        """
+        return {
+            "address": self.user_addresses.get(user_id),
+            "is_monitoring": user_id in self.monitoring_tasks,
+            "interval": self.monitoring_intervals.get(user_id, self.DEFAULT_CHECK_INTERVAL)
+        }
+    
     async def start_monitoring(self, user_id: int, bot, check_interval: int = 3600):
         """
         Запускает проактивный мониторинг для пользователя
@@ -230,6 +322,7 @@ class DTEKMonitorService:
             self._monitoring_loop(user_id, bot, check_interval)
         )
         self.monitoring_tasks[user_id] = task
+        self.monitoring_intervals[user_id] = check_interval
         logger.info(f"✅ Monitoring started for user {user_id}")
     
     async def stop_monitoring(self, user_id: int):
@@ -238,6 +331,7 @@ class DTEKMonitorService:
             task = self.monitoring_tasks[user_id]
             task.cancel()
             del self.monitoring_tasks[user_id]
+            self.monitoring_intervals.pop(user_id, None)
             logger.info(f"⏸️ Monitoring stopped for user {user_id}")
     
     async def _monitoring_loop(self, user_id: int, bot, check_interval: int):
@@ -9,8 +9,12 @@
 """
 from typing import Dict, Optional, List, Tuple
 from datetime import datetime, timedelta
+from collections import Counter
+from bisect import bisect_right
 import json
 
+from cachetools import TTLCache
+
 
 class EmotionalIntelligence:
     """
@@ -219,6 +223,8 @@ class EmotionalIntelligence:
     def __init__(self, db=None):
         self.db = db
         self.emotion_history = {}  # user_id -> List[emotion_records]
+        # Сводки эмоций: user_id -> {hours: summary}, сбрасывается при новой записи
+        self._summary_cache = TTLCache(maxsize=5000, ttl=30)
     
     def analyze_emotion(self, message: str) -> Dict:
         """
@@ -353,6 +359,7 @@ class EmotionalIntelligence:
         }
         
         self.emotion_history[user_id].append(record)
+        self._summary_cache.pop(user_id, None)
         
         # Ограничиваем историю (последние 100 записей)
         if len(self.emotion_history[user_id]) > 100:
@@ -387,22 +394,41 @@ class EmotionalIntelligence:
                 "count": 10
             }
         """
-        if user_id not in self.emotion_history:
-            return {
-                "dominant_emotion": "neutral",
-                "emotions_distribution": {},
-                "average_intensity": 0.5,
-                "trend": "stable",
-                "count": 0
-            }
+        return self.get_emotion_summaries(user_id, hours)[0]
+    
+    def get_emotion_summaries(self, user_id: int, *hours: int) -> List[Dict]:
+        """
+        Сводки эмоций сразу за несколько периодов (см. get_emotion_summary)
+        
+        История проходится один раз на все периоды; результат кэшируется
+        на 30 секунд или до следующей записи эмоции.
+        
+        Args:
+            user_id: ID пользователя
+            *hours: Периоды в часах, например 24, 6
         
-        # Фильтруем по времени
-        cutoff_time = datetime.now() - timedelta(hours=hours)
-        recent_records = [
-            r for r in self.emotion_history[user_id]
-            if datetime.fromisoformat(r["timestamp"]) > cutoff_time
-        ]
+        Returns:
+            Сводки в том же порядке, что и hours
+        """
+        cached = self._summary_cache.get(user_id)
+        if cached is None:
+            cached = self._summary_cache[user_id] = {}
+        
+        missing = [h for h in hours if h not in cached]
+        if missing:
+            history = self.emotion_history.get(user_id, [])
+            # Записи добавляются по времени - период это суффикс истории
+            stamps = [datetime.fromisoformat(r["timestamp"]) for r in history]
+            now = datetime.now()
+            
+            for h in missing:
+                start = bisect_right(stamps, now - timedelta(hours=h))
+                cached[h] = self._summarize(history[start:])
         
+        return [cached[h] for h in hours]
+    
+    def _summarize(self, recent_records: List[Dict]) -> Dict:
+        """Сводка по уже отфильтрованным записям"""
         if not recent_records:
             return {
                 "dominant_emotion": "neutral",
@@ -413,13 +439,8 @@ class EmotionalIntelligence:
             }
         
         # Подсчитываем распределение эмоций
-        emotion_counts = {}
-        total_intensity = 0
-        
-        for record in recent_records:
-            emotion = record["emotion"]
-            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-            total_intensity += record["intensity"]
+        emotion_counts = Counter(record["emotion"] for record in recent_records)
+        total_intensity = sum(record["intensity"] for record in recent_records)
         
         # Нормализуем распределение
         total = len(recent_records)
@@ -428,7 +449,7 @@ class EmotionalIntelligence:
         }
         
         # Доминирующая эмоция
-        dominant_emotion = max(emotion_counts.items(), key=lambda x: x[1])[0]
+        dominant_emotion = emotion_counts.most_common(1)[0][0]
         
         # Средняя интенсивность
         average_intensity = total_intensity / total
@@ -484,17 +505,19 @@ class EmotionalIntelligence:
         else:
             return "stable"
     
-    def get_support_message(self, user_id: int) -> Optional[str]:
+    def get_support_message(self, user_id: int, summary: Optional[Dict] = None) -> Optional[str]:
         """
         Генерирует поддерживающее сообщение если нужно
         
         Args:
             user_id: ID пользователя
+            summary: Уже полученная сводка за 6 часов (иначе берётся сама)
         
         Returns:
             Сообщение поддержки или None
         """
-        summary = self.get_emotion_summary(user_id, hours=6)
+        if summary is None:
+            summary = self.get_emotion_summary(user_id, hours=6)
         
         # Если человек давно в негативе
         if summary["count"] >= 3:
@@ -512,17 +535,19 @@ class EmotionalIntelligence:
         
         return None
     
-    def get_celebration_message(self, user_id: int) -> Optional[str]:
+    def get_celebration_message(self, user_id: int, summary: Optional[Dict] = None) -> Optional[str]:
         """
         Генерирует поздравительное сообщение если уместно
         
         Args:
             user_id: ID пользователя
+            summary: Уже полученная сводка за 6 часов (иначе берётся сама)
         
         Returns:
             Сообщение или None
         """
-        summary = self.get_emotion_summary(user_id, hours=6)
+        if summary is None:
+            summary = self.get_emotion_summary(user_id, hours=6)
         
         # Если тренд улучшился
         if summary["trend"] == "improving" and summary["count"] >= 3:
@@ -5,6 +5,8 @@ import aiohttp
 from typing import Dict, Optional
 import random
 
+from utils import async_ttl_cache
+
 
 class ExtrasService:
     """Дополнительные полезные функции"""
@@ -12,6 +14,11 @@ class ExtrasService:
     def __init__(self):
         pass
     
+    def is_cached(self, method, *args) -> bool:
+        """Есть ли свежий ответ method(*args) в кэше, то есть без запроса к внешнему API"""
+        return method.cache_contains(self, *args)
+    
+    @async_ttl_cache(ttl=600)
     async def get_weather(self, city: str = "Moscow") -> Optional[str]:
         """
         Получает погоду для города (через wttr.in)
@@ -28,6 +35,7 @@ class ExtrasService:
             print(f"❌ Ошибка получения погоды: {e}")
             return None
     
+    @async_ttl_cache(ttl=3600)
     async def get_exchange_rates(self, base: str = "USD") -> Optional[Dict]:
         """
         Получает курсы валют
@@ -50,6 +58,7 @@ class ExtrasService:
             print(f"❌ Ошибка получения курсов: {e}")
             return None
     
+    @async_ttl_cache(ttl=30)
     async def get_crypto_price(self, symbol: str = "BTC") -> Optional[Dict]:
         """
         Получает цену криптовалюты
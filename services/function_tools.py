@@ -457,10 +457,9 @@ class FunctionExecutor:
             result += f"• SCH (проверено): {reports.get('total_sch', 0)}\n"
             result += f"• ⚠️ Скам-ассистенты: {reports.get('scam_detected', 0)} из {reports['workers_count']}\n\n"
             
-            # Все работники отсортированные по SFS
-            sorted_workers = sorted(reports['workers'], key=lambda x: x.get('sfs', 0), reverse=True)
+            # Все работники (парсер уже отсортировал их по SFS)
             result += f"Работники (сортировка по SFS):\n"
-            for i, w in enumerate(sorted_workers, 1):
+            for i, w in enumerate(reports['workers'], 1):
                 scam_marker = " ⚠️[СКАМ]" if w.get('has_scam') else ""
                 result += f"{i}. {w['name']}{scam_marker}\n"
                 result += f"   SFS: {w['sfs']} | Only Now: {w.get('only_now', 0)} | SCH: {w['sch']}\n"
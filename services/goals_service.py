@@ -9,9 +9,12 @@
 """
 from typing import Dict, List, Optional, Literal
 from datetime import datetime, timedelta
+from operator import itemgetter
 import json
 import pytz
 
+from cachetools import TTLCache
+
 
 GoalType = Literal["daily", "weekly", "monthly", "custom"]
 GoalStatus = Literal["active", "completed", "failed", "paused"]
@@ -26,7 +29,11 @@ class GoalsService:
         self.db = db
         self.ai = ai
         self.goals_storage = {}  # user_id -> List[Goal]
+        self.goals_by_status = {}  # user_id -> {status -> List[Goal]}; индекс поверх goals_storage
         self.achievements = {}  # user_id -> List[Achievement]
+        # Статистика по user_id; сбрасывается при любом изменении целей,
+        # TTL - чтобы серия (streak) пересчитывалась после смены дня
+        self._stats_cache = TTLCache(maxsize=5000, ttl=60)
         
     async def create_goal(
         self,
@@ -68,6 +75,8 @@ class GoalsService:
                 next_month = now.replace(day=28) + timedelta(days=4)
                 deadline = (next_month - timedelta(days=next_month.day-1)).replace(hour=23, minute=59)
         
+        now = datetime.now(pytz.timezone('Europe/Kiev'))
+        
         goal = {
             "id": len(self.goals_storage[user_id]) + 1,
             "title": title,
@@ -75,14 +84,20 @@ class GoalsService:
             "type": goal_type,
             "status": "active",
             "progress": 0,
-            "created_at": datetime.now(pytz.timezone('Europe/Kiev')).isoformat(),
+            "created_at": now.isoformat(),
             "deadline": deadline.isoformat() if deadline else None,
             "milestones": milestones or [],
             "completed_milestones": [],
-            "last_updated": datetime.now(pytz.timezone('Europe/Kiev')).isoformat()
+            "last_updated": now.isoformat(),
+            # Разобранные даты рядом с ISO-строками, чтобы не парсить их при каждом показе
+            "_created_at_dt": now,
+            "_last_updated_dt": now,
+            "_deadline_dt": deadline
         }
         
         self.goals_storage[user_id].append(goal)
+        self.goals_by_status.setdefault(user_id, {}).setdefault("active", []).append(goal)
+        self._stats_cache.pop(user_id, None)
         
         # Сохраняем в БД если доступна
         if self.db:
@@ -129,10 +144,11 @@ class GoalsService:
         
         # Проверяем завершение
         if goal["progress"] >= 100:
-            goal["status"] = "completed"
+            self._set_status(user_id, goal, "completed")
             await self._create_achievement(user_id, goal)
         
-        goal["last_updated"] = datetime.now(pytz.timezone('Europe/Kiev')).isoformat()
+        self._touch(goal)
+        self._stats_cache.pop(user_id, None)
         
         # Сохраняем в БД
         if self.db:
@@ -151,10 +167,7 @@ class GoalsService:
         Returns:
             Список активных целей
         """
-        if user_id not in self.goals_storage:
-            return []
-        
-        goals = [g for g in self.goals_storage[user_id] if g["status"] == "active"]
+        goals = await self.get_goals_by_status(user_id, "active")
         
         if goal_type:
             goals = [g for g in goals if g["type"] == goal_type]
@@ -164,6 +177,31 @@ class GoalsService:
         
         return goals
     
+    async def get_goals_by_status(self, user_id: int, status: GoalStatus) -> List[Dict]:
+        """
+        Получает цели пользователя с заданным статусом
+        
+        Returns:
+            Список целей в порядке перехода в этот статус
+        """
+        return list(self.goals_by_status.get(user_id, {}).get(status, ()))
+    
+    def _touch(self, goal: Dict):
+        """Обновляет время последнего изменения цели"""
+        now = datetime.now(pytz.timezone('Europe/Kiev'))
+        goal["last_updated"] = now.isoformat()
+        goal["_last_updated_dt"] = now
+    
+    def _set_status(self, user_id: int, goal: Dict, status: GoalStatus):
+        """Меняет статус цели и переносит её в соответствующий список индекса"""
+        if goal["status"] == status:
+            return
+        
+        buckets = self.goals_by_status.setdefault(user_id, {})
+        buckets[goal["status"]].remove(goal)
+        buckets.setdefault(status, []).append(goal)
+        goal["status"] = status
+    
     async def get_goal(self, user_id: int, goal_id: int) -> Optional[Dict]:
         """Получает цель по ID"""
         return self._get_goal(user_id, goal_id)
@@ -185,9 +223,10 @@ class GoalsService:
         if not goal:
             return None
         
-        goal["status"] = "completed"
+        self._set_status(user_id, goal, "completed")
         goal["progress"] = 100
-        goal["last_updated"] = datetime.now(pytz.timezone('Europe/Kiev')).isoformat()
+        self._touch(goal)
+        self._stats_cache.pop(user_id, None)
         
         # Создаем достижение
         await self._create_achievement(user_id, goal)
@@ -204,8 +243,9 @@ class GoalsService:
         if not goal:
             return None
         
-        goal["status"] = "paused"
-        goal["last_updated"] = datetime.now(pytz.timezone('Europe/Kiev')).isoformat()
+        self._set_status(user_id, goal, "paused")
+        self._touch(goal)
+        self._stats_cache.pop(user_id, None)
         
         if self.db:
             await self._save_goal_to_db(user_id, goal)
@@ -219,8 +259,9 @@ class GoalsService:
             return None
         
         if goal["status"] == "paused":
-            goal["status"] = "active"
-            goal["last_updated"] = datetime.now(pytz.timezone('Europe/Kiev')).isoformat()
+            self._set_status(user_id, goal, "active")
+            self._touch(goal)
+            self._stats_cache.pop(user_id, None)
             
             if self.db:
                 await self._save_goal_to_db(user_id, goal)
@@ -235,6 +276,8 @@ class GoalsService:
         goal = self._get_goal(user_id, goal_id)
         if goal:
             self.goals_storage[user_id].remove(goal)
+            self.goals_by_status[user_id][goal["status"]].remove(goal)
+            self._stats_cache.pop(user_id, None)
             
             # Удаляем из БД
             if self.db:
@@ -267,7 +310,7 @@ class GoalsService:
             if not goal.get("deadline"):
                 continue
             
-            deadline = datetime.fromisoformat(goal["deadline"])
+            deadline = goal.get("_deadline_dt") or datetime.fromisoformat(goal["deadline"])
             if deadline.tzinfo is None:
                 deadline = ukraine_tz.localize(deadline)
             
@@ -275,7 +318,8 @@ class GoalsService:
             
             if time_left.total_seconds() < 0:
                 # Просрочено
-                goal["status"] = "failed"
+                self._set_status(user_id, goal, "failed")
+                self._stats_cache.pop(user_id, None)
                 alerts.append({
                     "goal": goal,
                     "status": "overdue",
@@ -311,6 +355,13 @@ class GoalsService:
                 "current_streak": 3
             }
         """
+        stats = self._stats_cache.get(user_id)
+        if stats is None:
+            stats = self._stats_cache[user_id] = await self._compute_statistics(user_id)
+        return stats
+    
+    async def _compute_statistics(self, user_id: int) -> Dict:
+        """Считает статистику по целям (см. get_statistics)"""
         if user_id not in self.goals_storage:
             return {
                 "total_goals": 0,
@@ -323,14 +374,14 @@ class GoalsService:
                 "current_streak": 0
             }
         
-        goals = self.goals_storage[user_id]
+        by_status = self.goals_by_status.get(user_id, {})
         
-        active = len([g for g in goals if g["status"] == "active"])
-        completed = len([g for g in goals if g["status"] == "completed"])
-        failed = len([g for g in goals if g["status"] == "failed"])
-        paused = len([g for g in goals if g["status"] == "paused"])
+        active = len(by_status.get("active", ()))
+        completed = len(by_status.get("completed", ()))
+        failed = len(by_status.get("failed", ()))
+        paused = len(by_status.get("paused", ()))
         
-        total = len(goals)
+        total = len(self.goals_storage[user_id])
         completion_rate = completed / total if total > 0 else 0.0
         
         achievements_count = len(self.achievements.get(user_id, []))
@@ -409,6 +460,7 @@ class GoalsService:
         }
         
         self.achievements[user_id].append(achievement)
+        self._stats_cache.pop(user_id, None)
     
     def _get_achievement_icon(self, goal: Dict) -> str:
         """Возвращает иконку достижения в зависимости от типа цели"""
@@ -422,15 +474,9 @@ class GoalsService:
     
     async def _calculate_streak(self, user_id: int) -> int:
         """Подсчитывает текущую серию выполненных целей"""
-        if user_id not in self.goals_storage:
-            return 0
-        
         # Получаем завершенные цели, отсортированные по дате
-        completed_goals = [
-            g for g in self.goals_storage[user_id]
-            if g["status"] == "completed"
-        ]
-        completed_goals.sort(key=lambda g: g["last_updated"], reverse=True)
+        completed_goals = await self.get_goals_by_status(user_id, "completed")
+        completed_goals.sort(key=itemgetter("last_updated"), reverse=True)
         
         if not completed_goals:
             return 0
@@ -442,7 +488,7 @@ class GoalsService:
         
         current_date = today
         for goal in completed_goals:
-            goal_date = datetime.fromisoformat(goal["last_updated"]).date()
+            goal_date = (goal.get("_last_updated_dt") or datetime.fromisoformat(goal["last_updated"])).date()
             
             if goal_date == current_date or goal_date == current_date - timedelta(days=1):
                 streak += 1
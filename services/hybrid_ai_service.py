@@ -8,7 +8,7 @@
 
 Все модели представляют единую личность AIVE!
 """
-from typing import List, Dict, Optional, Literal
+from typing import List, Dict, Optional, Literal, AsyncIterator
 from services.ai_service import AIService
 from services.gemini_service import GeminiService
 from services.openai_service import OpenAIService
@@ -108,10 +108,11 @@ class HybridAIService:
                     emotional_instructions = self.emotional.get_response_instructions(emotion_analysis)
                     
                     # Добавляем/обновляем системный промпт
+                    # (заменяем dict копией - исходные сообщения вызывающего не меняем)
                     system_found = False
-                    for msg in processed_messages:
+                    for i, msg in enumerate(processed_messages):
                         if msg["role"] == "system":
-                            msg["content"] = f"{msg['content']}\n\n{emotional_instructions}"
+                            processed_messages[i] = {**msg, "content": f"{msg['content']}\n\n{emotional_instructions}"}
                             system_found = True
                             break
                     
@@ -265,6 +266,31 @@ class HybridAIService:
             system_prompt
         )
     
+    async def reasoning_chat_stream(
+        self,
+        user_message: str,
+        context_messages: List[Dict[str, str]] = None,
+        system_prompt: str = None
+    ) -> AsyncIterator[str]:
+        """
+        Потоковый reasoning mode - DeepSeek Reasoner через SSE
+        
+        Args:
+            user_message: Вопрос или задача
+            context_messages: История (опционально)
+            system_prompt: Системный промпт
+        
+        Yields:
+            Куски ответа по мере генерации
+        """
+        self.usage_stats["deepseek"] += 1
+        async for chunk in self.deepseek.reasoning_chat_stream(
+            user_message,
+            context_messages,
+            system_prompt
+        ):
+            yield chunk
+    
     async def analyze_with_image(
         self,
         text: str,
@@ -7,7 +7,7 @@ import io
 import base64
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
-from typing import Optional
+from typing import Optional, Union
 import config
 import logging
 
@@ -34,14 +34,14 @@ class VisionService:
             self.model_name = None
     
     async def analyze_image(self, 
-                           image_bytes: bytes, 
+                           image_bytes: Union[bytes, bytearray], 
                            question: str = None,
                            language: str = "ru") -> Optional[str]:
         """
         Анализирует изображение
         
         Args:
-            image_bytes: Байты изображения
+            image_bytes: Байты изображения (bytes или bytearray)
             question: Вопрос по изображению (опционально)
             language: Язык ответа (ru/uk/en)
             
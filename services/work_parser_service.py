@@ -5,16 +5,22 @@
 import asyncio
 import json
 from datetime import datetime, date
+from operator import itemgetter
 from typing import Dict, List, Optional, Any
 from pathlib import Path
 import logging
 
+from cachetools import TTLCache
 from playwright.async_api import async_playwright, Browser, Page, TimeoutError as PlaywrightTimeout
 
 import config
+from utils import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Сколько секунд отчет с сайта считается свежим (команды и AI-функции подряд не парсят сайт заново)
+_REPORTS_TTL = 60
+
 
 class WorkParserService:
     """Сервис для парсинга отчетов работников с веб-панели"""
@@ -34,6 +40,14 @@ class WorkParserService:
         self.screenshots_dir = config.DATA_DIR / "screenshots"
         self.screenshots_dir.mkdir(exist_ok=True)
         
+        # (команда, дата) -> успешный отчет; параллельные запросы ключа ждут один парсинг
+        self._reports_cache = TTLCache(maxsize=64, ttl=_REPORTS_TTL)
+        self._reports_flight = SingleFlight()
+        # id(workers) -> (workers, [(имя в нижнем регистре, работник)], {имя: работник}) для find_worker
+        self._name_indexes = TTLCache(maxsize=64, ttl=_REPORTS_TTL)
+        # Браузер у экземпляра один - парсинги разных ключей не должны пересекаться
+        self._browser_lock = asyncio.Lock()
+        
         # CSS селекторы
         self.SELECTORS = {
             # Авторизация
@@ -148,15 +162,39 @@ class WorkParserService:
         report_date: Optional[str] = None
     ) -> Dict[str, Any]:
         """
-        Парсинг отчетов работников
+        Парсинг отчетов работников с коротким кэшем
+        
+        Успешный отчет отдаётся из кэша _REPORTS_TTL секунд. Параллельные запросы
+        одного ключа ждут один парсинг и получают его результат, в том числе ошибку.
+        Результат общий для всех вызывающих - его нельзя менять.
         
         Args:
             team: Название команды ("Good Bunny", "Velvet", или "all")
             report_date: Дата в формате YYYY-MM-DD (по умолчанию - сегодня)
         
         Returns:
-            Словарь с данными отчетов
+            Словарь с данными отчетов; workers отсортированы по SFS (по убыванию)
         """
+        if not report_date:
+            report_date = date.today().strftime("%Y-%m-%d")
+        key = (team, report_date)
+        
+        cached = self._reports_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        async def load() -> Dict[str, Any]:
+            async with self._browser_lock:
+                result = await self._scrape_reports(team, report_date)
+            # Ошибки не кэшируем - следующий вызов попробует снова
+            if result.get("success"):
+                self._reports_cache[key] = result
+            return result
+        
+        return await self._reports_flight.run(key, load)
+    
+    async def _scrape_reports(self, team: str, report_date: str) -> Dict[str, Any]:
+        """Парсинг отчетов с сайта (без кэша; вызывать под _browser_lock)"""
         try:
             await self._init_browser()
             
@@ -172,10 +210,6 @@ class WorkParserService:
             logger.info(f"📊 Переход на страницу отчетов: {reports_url}")
             await page.goto(reports_url, wait_until="networkidle")
             
-            # Установка фильтров
-            if not report_date:
-                report_date = date.today().strftime("%Y-%m-%d")
-            
             # Устанавливаем дату через evaluate (для input type="date" нужно устанавливать value)
             try:
                 await page.evaluate(f"""
@@ -264,6 +298,9 @@ class WorkParserService:
             
             await page.close()
             
+            # Сортируем один раз здесь - потребителям не нужно пересортировывать
+            workers.sort(key=itemgetter("sfs"), reverse=True)
+            
             result = {
                 "success": True,
                 "date": report_date,
@@ -487,6 +524,27 @@ class WorkParserService:
             except:
                 return None
     
+    def find_worker(self, report: Dict[str, Any], name: str) -> Optional[Dict[str, Any]]:
+        """
+        Ищет работника в отчете без учета регистра: сначала точное имя, затем вхождение подстроки
+        
+        Имена в нижнем регистре считаются один раз на отчет, а не на каждый поиск.
+        """
+        workers = report.get("workers", [])
+        entry = self._name_indexes.get(id(workers))
+        # Ссылка на сам список в записи: id не переиспользуется, пока запись жива
+        if entry is None or entry[0] is not workers:
+            lower_names = [(w["name"].lower(), w) for w in workers]
+            # reversed: при одинаковых именах в индексе остаётся первый по списку (с большим SFS)
+            entry = (workers, lower_names, {n: w for n, w in reversed(lower_names)})
+            self._name_indexes[id(workers)] = entry
+        
+        query = name.lower()
+        found = entry[2].get(query)
+        if found is None:
+            found = next((w for n, w in entry[1] if query in n), None)
+        return found
+    
     async def get_worker_scam_screenshots(
         self, 
         worker_name: str, 
@@ -505,11 +563,7 @@ class WorkParserService:
                 return reports
             
             # Ищем работника
-            worker = None
-            for w in reports["workers"]:
-                if worker_name.lower() in w["name"].lower():
-                    worker = w
-                    break
+            worker = self.find_worker(reports, worker_name)
             
             if not worker:
                 return {
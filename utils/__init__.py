@@ -0,0 +1,12 @@
+"""
+Вспомогательные утилиты бота
+"""
+from .ttl_cache import async_ttl_cache
+from .single_flight import SingleFlight
+from .user_cooldown import Cooldown
+
+__all__ = [
+    "async_ttl_cache",
+    "SingleFlight",
+    "Cooldown"
+]
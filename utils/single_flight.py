@@ -0,0 +1,46 @@
+"""
+Объединение одинаковых параллельных запросов
+"""
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+import asyncio
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Single-flight: пока запрос по ключу идёт, остальные вызовы с тем же
+    ключом ждут его результат (или исключение), а не запускают свой
+    
+    Пример:
+        flight = SingleFlight()
+        report = await flight.run(report_date, lambda: parser.parse_reports(report_date=report_date))
+    """
+    
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+    
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        Выполняет factory() для ключа или присоединяется к уже идущему вызову
+        
+        Args:
+            key: Ключ запроса
+            factory: Фабрика корутины (вызывается, только если запроса по ключу нет)
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        
+        # shield: отмена одного ожидающего не отменяет общий запрос
+        return await asyncio.shield(task)
+    
+    def _done(self, key: Hashable, task: asyncio.Future):
+        """Снимает завершённый запрос из идущих"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Ошибку получают ожидающие; если их не осталось - не шумим "never retrieved"
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,51 @@
+"""
+TTL кэш для асинхронных функций
+"""
+from typing import Callable
+import functools
+
+from cachetools import TTLCache
+
+from .single_flight import SingleFlight
+
+
+def async_ttl_cache(ttl: float, maxsize: int = 256) -> Callable:
+    """
+    Кэширует результат корутины по аргументам на ttl секунд
+    
+    - Параллельные вызовы с одинаковыми аргументами ждут один запрос
+    - None (ошибка запроса) не кэшируется
+    - При переполнении вытесняется давно не использованный ключ (LRU)
+    - wrapper.cache_contains(*args, **kwargs) - есть ли свежее значение для этих аргументов
+    
+    Args:
+        ttl: Время жизни значения в секундах
+        maxsize: Максимум ключей в кэше
+    """
+    def decorator(func: Callable) -> Callable:
+        cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        flight = SingleFlight()
+        
+        def make_key(args, kwargs):
+            return args, tuple(sorted(kwargs.items()))
+        
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = make_key(args, kwargs)
+            
+            value = cache.get(key)
+            if value is not None:
+                return value
+            
+            async def load():
+                result = await func(*args, **kwargs)
+                if result is not None:
+                    cache[key] = result
+                return result
+            
+            return await flight.run(key, load)
+        
+        wrapper.cache_contains = lambda *args, **kwargs: cache.get(make_key(args, kwargs)) is not None
+        return wrapper
+    
+    return decorator
@@ -0,0 +1,45 @@
+"""
+Ограничение частоты команд для каждого пользователя
+"""
+from typing import Dict, Optional, Tuple
+import time
+
+
+class Cooldown:
+    """
+    Кулдаун в памяти: (user_id, ключ команды) -> когда снова можно
+    
+    Пример:
+        if wait := cooldown.hit(user.id, "dtek_now", 5.0):
+            await update.message.reply_text(f"⏳ Подожди {math.ceil(wait)}с")
+            return
+    """
+    
+    def __init__(self, max_entries: int = 10000):
+        self._until: Dict[Tuple[int, str], float] = {}
+        self._max_entries = max_entries
+    
+    def hit(self, user_id: int, key: str, seconds: float) -> Optional[float]:
+        """
+        Отмечает вызов команды
+        
+        Returns:
+            None если вызов разрешён, иначе сколько секунд ещё ждать
+        """
+        now = time.monotonic()
+        slot = (user_id, key)
+        
+        until = self._until.get(slot)
+        if until is not None and now < until:
+            return until - now
+        
+        self._until[slot] = now + seconds
+        
+        if len(self._until) > self._max_entries:
+            self._prune(now)
+        
+        return None
+    
+    def _prune(self, now: float):
+        """Удаляет истёкшие записи"""
+        self._until = {slot: until for slot, until in self._until.items() if until > now}